@@ -4,13 +4,18 @@ JWT-based authentication with register, login, and user endpoints
 """
 
 import os
+import hashlib
+import time
 from datetime import datetime, timedelta
 from functools import wraps
 from flask import Blueprint, request, jsonify, g
 import jwt
 import bcrypt
+from argon2 import PasswordHasher
+from argon2.exceptions import VerifyMismatchError, InvalidHashError
 
 from models import User
+from cache import cache_get, cache_set
 
 # Create blueprint
 auth_bp = Blueprint('auth', __name__, url_prefix='/api/auth')
@@ -18,7 +23,15 @@ auth_bp = Blueprint('auth', __name__, url_prefix='/api/auth')
 # JWT Configuration
 JWT_SECRET = os.getenv('JWT_SECRET', 'focusflow-dev-secret-change-in-production')
 JWT_ALGORITHM = 'HS256'
+# Encoded once here instead of on every encode/decode call
+JWT_SECRET_BYTES = JWT_SECRET.encode('utf-8')
+JWT_ALGORITHMS = [JWT_ALGORITHM]
 JWT_EXPIRATION_HOURS = 24 * 7  # 7 days
+# Password hashing: argon2id (OWASP minimum profile). Much cheaper per login than
+# bcrypt's default 12 rounds at comparable strength; bcrypt hashes ($2...) still verify
+# and are upgraded on the next successful login.
+password_hasher = PasswordHasher(time_cost=2, memory_cost=19456, parallelism=1)
+TOKEN_CACHE_MAX_SECONDS = 300  # Re-check a cached token against the users table every 5 minutes (deleted users)
 
 
 def generate_token(user_id: int) -> str:
@@ -28,13 +41,13 @@ def generate_token(user_id: int) -> str:
         'exp': datetime.utcnow() + timedelta(hours=JWT_EXPIRATION_HOURS),
         'iat': datetime.utcnow()
     }
-    return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
+    return jwt.encode(payload, JWT_SECRET_BYTES, algorithm=JWT_ALGORITHM)
 
 
 def decode_token(token: str) -> dict:
     """Decode and validate a JWT token"""
     try:
-        payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
+        payload = jwt.decode(token, JWT_SECRET_BYTES, algorithms=JWT_ALGORITHMS)
         return payload
     except jwt.ExpiredSignatureError:
         return None
@@ -43,14 +56,23 @@ def decode_token(token: str) -> dict:
 
 
 def hash_password(password: str) -> str:
-    """Hash a password using bcrypt"""
-    salt = bcrypt.gensalt()
-    return bcrypt.hashpw(password.encode('utf-8'), salt).decode('utf-8')
+    """Hash a password using argon2id"""
+    return password_hasher.hash(password)
 
 
 def verify_password(password: str, password_hash: str) -> bool:
-    """Verify a password against its hash"""
-    return bcrypt.checkpw(password.encode('utf-8'), password_hash.encode('utf-8'))
+    """Verify a password against its hash (argon2id, or legacy bcrypt)"""
+    if password_hash.startswith('$2'):
+        return bcrypt.checkpw(password.encode('utf-8'), password_hash.encode('utf-8'))
+    try:
+        return password_hasher.verify(password_hash, password)
+    except (VerifyMismatchError, InvalidHashError):
+        return False
+
+
+def password_needs_rehash(password_hash: str) -> bool:
+    """True for legacy bcrypt hashes or argon2 hashes with outdated parameters"""
+    return password_hash.startswith('$2') or password_hasher.check_needs_rehash(password_hash)
 
 
 def require_auth(f):
@@ -70,6 +92,10 @@ def require_auth(f):
         
         token = parts[1]
         
+        # load_logged_in_user already validated this header for the request
+        if getattr(g, 'user_id', None):
+            return f(*args, **kwargs)
+        
         # Decode token
         payload = decode_token(token)
         if not payload:
@@ -89,7 +115,7 @@ def get_current_user(Session):
     
     session = Session()
     try:
-        user = session.query(User).filter_by(id=g.user_id).first()
+        user = session.get(User, g.user_id)
         return user
     finally:
         session.close()
@@ -175,6 +201,9 @@ def init_auth_routes(Session):
             if user.password_hash:
                 if not verify_password(password, user.password_hash):
                     return jsonify({'error': 'Invalid email or password'}), 401
+                if password_needs_rehash(user.password_hash):
+                    user.password_hash = hash_password(password)
+                    session.commit()
             else:
                 # Demo user - accept any password
                 pass
@@ -199,7 +228,7 @@ def init_auth_routes(Session):
         """Get current authenticated user"""
         session = Session()
         try:
-            user = session.query(User).filter_by(id=g.user_id).first()
+            user = session.get(User, g.user_id)
             
             if not user:
                 return jsonify({'error': 'User not found'}), 404
@@ -216,32 +245,46 @@ def init_auth_routes(Session):
     return auth_bp
 
 
-def get_user_from_token(token, Session):
+def get_user_id_from_token(token, Session):
     """
-    Helper function to decode a token and return the User object.
-    Requires the database Session factory to be passed in.
+    Resolve a bearer token to a user id for load_logged_in_user.
+    token -> user id is cached (Redis or in-process, see cache.py) for up to
+    TOKEN_CACHE_MAX_SECONDS, so repeat requests skip jwt.decode and the users lookup;
+    a deleted user's tokens stop resolving once the entry lapses.
+    If the cache is unreachable the token is decoded and looked up uncached.
     """
     try:
         if not token:
             return None
-            
-        # Clean the token if it has "Bearer " prefix
         if token.startswith('Bearer '):
             token = token.split(' ')[1]
-            
-        # Use the existing decode_token function in this file
+        
+        cache_key = f"tok:{hashlib.sha256(token.encode('utf-8')).hexdigest()[:32]}"
+        try:
+            cached = cache_get(cache_key)
+        except Exception as e:
+            print(f"Token cache error: {e}")
+            cache_key, cached = None, None
+        if cached is not None:
+            return int(cached)
+        
         payload = decode_token(token)
         if not payload:
             return None
         
-        # Query the database
-        session = Session()
-        try:
-            user = session.query(User).filter_by(id=payload['user_id']).first()
-            return user
-        finally:
-            session.close()
-            
+        # Request-scoped session: the user stays in the identity map for get_current_user
+        user = Session().get(User, payload['user_id'])
+        if not user:
+            return None
+        
+        ttl = min(int(payload['exp'] - time.time()), TOKEN_CACHE_MAX_SECONDS)
+        if cache_key is not None and ttl > 0:
+            try:
+                cache_set(cache_key, str(user.id).encode('utf-8'), ttl)
+            except Exception as e:
+                print(f"Token cache error: {e}")
+        return user.id
+    
     except Exception as e:
         print(f"Token Error: {e}")
-        return None
\ No newline at end of file
+        return None
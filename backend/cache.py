@@ -0,0 +1,191 @@
+"""
+FocusFlow - Response Cache
+Short-lived cache for hot, frequently polled GET endpoints (dashboard, friends).
+Uses Redis when REDIS_URL is set so all workers share one cache; otherwise
+falls back to an in-process TTL dict.
+Write endpoints invalidate the affected keys explicitly and bump a per-user
+version counter, which polled GETs turn into a weak ETag for 304 responses.
+"""
+
+import os
+import time
+from functools import wraps
+from flask import current_app, request, g
+
+DEFAULT_TTL_SECONDS = 60
+_MEMORY_CACHE_MAX_KEYS = 1024
+
+# Redis client - will be initialized if REDIS_URL is available
+redis_client = None
+
+try:
+    import redis
+    redis_url = os.getenv('REDIS_URL')
+    if redis_url:
+        redis_client = redis.Redis.from_url(redis_url)
+except ImportError:
+    pass
+
+# In-process fallback: key -> (expires_at, body)
+_memory_cache = {}
+
+# In-process fallback: version key -> counter. Seeded from the clock so ETags
+# handed out before a restart never match versions issued after it.
+_memory_versions = {}
+
+
+def cache_get(key: str):
+    """Return the cached bytes for key, or None on a miss."""
+    if redis_client is not None:
+        return redis_client.get(key)
+    entry = _memory_cache.get(key)
+    if entry is None:
+        return None
+    expires_at, body = entry
+    if expires_at < time.monotonic():
+        _memory_cache.pop(key, None)
+        return None
+    return body
+
+
+def cache_set(key: str, body: bytes, ttl: int = DEFAULT_TTL_SECONDS):
+    """Store bytes under key for ttl seconds."""
+    if redis_client is not None:
+        redis_client.setex(key, ttl, body)
+        return
+    now = time.monotonic()
+    if len(_memory_cache) >= _MEMORY_CACHE_MAX_KEYS:
+        for k in [k for k, (exp, _) in _memory_cache.items() if exp < now]:
+            del _memory_cache[k]
+    _memory_cache[key] = (now + ttl, body)
+
+
+def cache_delete(*keys: str):
+    """Invalidate one or more exact keys."""
+    if redis_client is not None:
+        if keys:
+            redis_client.delete(*keys)
+        return
+    for key in keys:
+        _memory_cache.pop(key, None)
+
+
+def cache_delete_prefix(prefix: str):
+    """Invalidate every key starting with prefix (e.g. all dates of a user's dashboard)."""
+    if redis_client is not None:
+        keys = list(redis_client.scan_iter(match=f"{prefix}*"))
+        if keys:
+            redis_client.delete(*keys)
+        return
+    for key in [k for k in _memory_cache if k.startswith(prefix)]:
+        del _memory_cache[key]
+
+
+def cache_endpoint(key, ttl: int = DEFAULT_TTL_SECONDS):
+    """
+    Decorator: cache a JSON view's 200 response body.
+
+    Args:
+        key: Callable returning the cache key for the current request,
+             or None to bypass the cache (e.g. unauthenticated demo requests)
+        ttl: Seconds before the entry expires on its own
+    """
+    def decorator(f):
+        @wraps(f)
+        def wrapped(*args, **kwargs):
+            cache_key = key()
+            if cache_key is None:
+                return f(*args, **kwargs)
+
+            body = cache_get(cache_key)
+            if body is not None:
+                return current_app.response_class(body, mimetype='application/json')
+
+            response = current_app.make_response(f(*args, **kwargs))
+            if response.status_code == 200:
+                cache_set(cache_key, response.get_data(), ttl)
+            return response
+        return wrapped
+    return decorator
+
+
+def get_version(key: str) -> int:
+    """Current value of a version counter."""
+    if redis_client is not None:
+        value = redis_client.get(key)
+        return int(value) if value is not None else 0
+    return _memory_versions.setdefault(key, time.time_ns())
+
+
+def bump_version(*keys: str):
+    """Advance one or more version counters so outstanding ETags stop matching."""
+    if redis_client is not None:
+        for key in keys:
+            redis_client.incr(key)
+        return
+    for key in keys:
+        _memory_versions[key] = get_version(key) + 1
+
+
+def etag_endpoint(key, version, ttl: int = DEFAULT_TTL_SECONDS):
+    """
+    Decorator: weak ETag / If-None-Match support for a JSON view.
+
+    The tag is the request key plus the user's current version counter, so a
+    matching If-None-Match is answered with 304 before the view (or cache) runs.
+    Tags also roll over every ttl seconds, so data the version does not track
+    (e.g. a friend's XP) goes no staler than the response cache allows.
+
+    Args:
+        key: Callable returning a key identifying the request variant
+             (user, date, tz offset...), or None to skip ETags
+        version: Callable taking the user id and returning its version key
+        ttl: Seconds a tag stays valid without a version bump
+    """
+    def decorator(f):
+        @wraps(f)
+        def wrapped(*args, **kwargs):
+            tag_key = key()
+            if tag_key is None:
+                return f(*args, **kwargs)
+
+            window = int(time.time()) // ttl
+            etag = f"{tag_key}-{get_version(version(g.user_id))}-{window}"
+            if request.if_none_match.contains_weak(etag):
+                response = current_app.response_class(status=304)
+            else:
+                response = current_app.make_response(f(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag, weak=True)
+            return response
+        return wrapped
+    return decorator
+
+
+def activities_version_key(user_id: int) -> str:
+    return f"ver:activities:{user_id}"
+
+
+def friends_version_key(user_id: int) -> str:
+    return f"ver:friends:{user_id}"
+
+
+def dashboard_cache_prefix(user_id: int) -> str:
+    return f"dash:{user_id}:"
+
+
+def friends_cache_key(user_id: int) -> str:
+    return f"friends:{user_id}"
+
+
+def invalidate_dashboard(user_id: int):
+    """Drop every cached dashboard (all dates/offsets) and expire activity ETags for a user."""
+    cache_delete_prefix(dashboard_cache_prefix(user_id))
+    bump_version(activities_version_key(user_id))
+
+
+def invalidate_friends(*user_ids: int):
+    """Drop the cached friends list and expire friends ETags for each user involved."""
+    cache_delete(*(friends_cache_key(uid) for uid in user_ids))
+    bump_version(*(friends_version_key(uid) for uid in user_ids))
@@ -1,10 +1,9 @@
 """
-FocusFlow - Standard error responses and decorators.
+FocusFlow - Standard error responses and app-wide error handlers.
 JSON format: {"error": "Code", "message": "Human readable", "details": {...}}
 """
 
-from functools import wraps
-from flask import jsonify, request
+from flask import jsonify
 
 from marshmallow import ValidationError as MarshmallowValidationError
 
@@ -19,7 +18,7 @@ def api_error_response(code: str, message: str, details: dict = None, status_cod
 
 
 class APIError(Exception):
-    """Raise for API errors; use with handle_api_error decorator."""
+    """Raise for API errors; turned into the standard JSON response by register_error_handlers."""
     def __init__(self, message: str, code: str = "API_ERROR", status_code: int = 400, details: dict = None):
         self.message = message
         self.code = code
@@ -27,30 +26,23 @@ class APIError(Exception):
         self.details = details or {}
 
 
-def handle_validation_error(f):
-    """Decorator: catch Marshmallow ValidationError and return standard JSON."""
-    @wraps(f)
-    def wrapped(*args, **kwargs):
-        try:
-            return f(*args, **kwargs)
-        except MarshmallowValidationError as e:
-            return api_error_response(
-                "VALIDATION_ERROR",
-                "Validation failed",
-                details=e.messages if hasattr(e, "messages") else {"_": [str(e)]},
-                status_code=422
-            )
-        except APIError as e:
-            return api_error_response(e.code, e.message, e.details, e.status_code)
-    return wrapped
-
-
-def handle_api_error(f):
-    """Decorator: catch APIError and return standard JSON."""
-    @wraps(f)
-    def wrapped(*args, **kwargs):
-        try:
-            return f(*args, **kwargs)
-        except APIError as e:
-            return api_error_response(e.code, e.message, e.details, e.status_code)
-    return wrapped
+def _validation_error_response(e: MarshmallowValidationError):
+    return api_error_response(
+        "VALIDATION_ERROR",
+        "Validation failed",
+        details=e.messages if hasattr(e, "messages") else {"_": [str(e)]},
+        status_code=422
+    )
+
+
+def _api_error_response(e: APIError):
+    return api_error_response(e.code, e.message, e.details, e.status_code)
+
+
+def register_error_handlers(app):
+    """
+    Map Marshmallow ValidationError and APIError raised by any view to the standard
+    JSON error. Flask dispatches these itself, so views need no wrapper on the success path.
+    """
+    app.register_error_handler(MarshmallowValidationError, _validation_error_response)
+    app.register_error_handler(APIError, _api_error_response)
@@ -19,19 +19,17 @@ with engine.connect() as conn:
     # Let's try adding uppercase versions
     print("\nAdding uppercase enum values...")
     
-    for val in ['DAILY', 'WEEKLY', 'MONTHLY']:
-        try:
-            conn.execute(text(f"ALTER TYPE timeframeenum ADD VALUE IF NOT EXISTS '{val}'"))
-            print(f"  Added '{val}' to timeframeenum")
-        except Exception as e:
-            print(f"  Note for {val}: {e}")
-    
-    for val in ['TARGET', 'LIMIT']:
-        try:
-            conn.execute(text(f"ALTER TYPE goaltypeenum ADD VALUE IF NOT EXISTS '{val}'"))
-            print(f"  Added '{val}' to goaltypeenum")
-        except Exception as e:
-            print(f"  Note for {val}: {e}")
+    # All values in one server-side block (one round-trip). IF NOT EXISTS makes it
+    # idempotent; ALTER TYPE ... ADD VALUE inside a block needs PostgreSQL 12+
+    timeframe_values = ['DAILY', 'WEEKLY', 'MONTHLY']
+    goal_type_values = ['TARGET', 'LIMIT']
+    statements = (
+        [f"ALTER TYPE timeframeenum ADD VALUE IF NOT EXISTS '{val}';" for val in timeframe_values] +
+        [f"ALTER TYPE goaltypeenum ADD VALUE IF NOT EXISTS '{val}';" for val in goal_type_values]
+    )
+    conn.execute(text("DO $$ BEGIN " + " ".join(statements) + " END $$;"))
+    print(f"  Ensured {timeframe_values} in timeframeenum")
+    print(f"  Ensured {goal_type_values} in goaltypeenum")
     
     conn.commit()
     print("\n✅ Done! Restart the backend.")
@@ -3,10 +3,25 @@ FocusFlow - Gamification Engine
 Handles XP calculation, leveling, and badge awarding
 """
 
+import bisect
 import math
+import random
+import re
+from collections import Counter
+from itertools import accumulate
+from functools import lru_cache
 from datetime import datetime, timedelta
 from typing import List, Optional, Dict, Any
+from sqlalchemy import select, update, func, distinct, case, and_, Date
 from sqlalchemy.orm import Session as SQLSession
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm.attributes import set_committed_value
+
+from models import (
+    User, ActivityLog, CategoryEnum, Goal, GoalTypeEnum, TimeframeEnum,
+    Badge, UserBadge, Item, UserItem, RarityEnum
+)
+from utils import request_now
 
 
 # ============================================================================
@@ -48,7 +63,8 @@ def calculate_level(xp: int) -> int:
     """
     if xp <= 0:
         return 1
-    return int(math.sqrt(xp) * 0.2) + 1
+    # Integer form of floor(sqrt(xp) * 0.2): exact, no float round-trip
+    return math.isqrt(xp) // 5 + 1
 
 
 def xp_for_level(level: int) -> int:
@@ -64,7 +80,7 @@ def xp_for_level(level: int) -> int:
     """
     if level <= 1:
         return 0
-    return int(((level - 1) / 0.2) ** 2)
+    return 25 * (level - 1) ** 2  # ((level - 1) / 0.2) ** 2 in integer arithmetic
 
 
 def get_level_progress(xp: int) -> Dict[str, Any]:
@@ -77,6 +93,12 @@ def get_level_progress(xp: int) -> Dict[str, Any]:
     Returns:
         Dict with level info, progress percentage, and XP needed
     """
+    # Pure function of XP: memoized, copied so callers can't mutate the cached dict
+    return dict(_level_progress(xp))
+
+
+@lru_cache(maxsize=1024)
+def _level_progress(xp: int) -> Dict[str, Any]:
     current_level = calculate_level(xp)
     current_level_xp = xp_for_level(current_level)
     next_level_xp = xp_for_level(current_level + 1)
@@ -115,8 +137,6 @@ def award_xp(session: SQLSession, user, xp_amount: int) -> Dict[str, Any]:
     if leveled_up:
         user.level = new_level
     
-    session.commit()
-    
     return {
         "xp_awarded": xp_amount,
         "total_xp": user.xp,
@@ -185,91 +205,119 @@ BADGE_DEFINITIONS = [
 ]
 
 
-def check_night_owl(activity, user_activities: List, local_hour: int = None) -> bool:
+def _badge_stats(session: SQLSession, user_id: int, activity) -> Dict[str, int]:
+    """
+    Everything the non-timezone badges need, in one aggregate pass over the user's
+    activities (instead of a COUNT/SUM query per badge): lifetime totals, the
+    minutes logged on the new activity's day, and active days in the last week.
+    Unknown durations count as 30 minutes.
+    """
+    minutes = func.coalesce(ActivityLog.duration_minutes, 30)
+    
+    def minutes_where(condition):
+        return func.coalesce(func.sum(case((condition, minutes), else_=0)), 0)
+    
+    day_start = datetime.combine(activity.timestamp.date(), datetime.min.time())
+    streak_start = datetime.combine(request_now().date() - timedelta(days=6), datetime.min.time())
+    
+    row = session.execute(
+        select(
+            func.count(ActivityLog.id).label('total_activities'),
+            func.coalesce(func.sum(case((ActivityLog.is_focus_session == True, 1), else_=0)), 0).label('focus_sessions'),
+            minutes_where(ActivityLog.category == CategoryEnum.CAREER).label('career_minutes'),
+            minutes_where(ActivityLog.category == CategoryEnum.HEALTH).label('health_minutes'),
+            minutes_where(ActivityLog.category == CategoryEnum.SOCIAL).label('social_minutes'),
+            minutes_where(and_(
+                ActivityLog.timestamp >= day_start,
+                ActivityLog.timestamp < day_start + timedelta(days=1)
+            )).label('activity_day_minutes'),
+            func.count(distinct(case(
+                (ActivityLog.timestamp >= streak_start, func.date(ActivityLog.timestamp))
+            ))).label('active_days_last_week'),
+        ).where(ActivityLog.user_id == user_id)
+    ).one()
+    stats = row._asdict()
+    stats['activity_weekday'] = activity.timestamp.weekday()
+    return stats
+
+
+def _activity_minutes(session: SQLSession, user_id: int, *criteria) -> int:
+    """Total minutes (unknown durations count as 30) of the user's matching activities"""
+    return session.scalar(
+        select(func.coalesce(func.sum(func.coalesce(ActivityLog.duration_minutes, 30)), 0))
+        .where(ActivityLog.user_id == user_id, *criteria)
+    )
+
+
+def check_night_owl(activity, local_hour: int = None) -> bool:
     """Check if activity was logged between 10 PM and 4 AM (user's local time)"""
     # Use local_hour if provided, otherwise fall back to UTC timestamp
     hour = local_hour if local_hour is not None else activity.timestamp.hour
     return hour >= 22 or hour < 4
 
 
-def check_early_bird(activity, user_activities: List, local_hour: int = None) -> bool:
+def check_early_bird(activity, local_hour: int = None) -> bool:
     """Check if activity was logged before 7 AM (user's local time)"""
     hour = local_hour if local_hour is not None else activity.timestamp.hour
     return hour < 7
 
 
-def check_weekend_warrior(activity, user_activities: List) -> bool:
+def check_weekend_warrior(stats: Dict[str, int]) -> bool:
     """Check if user logged >5 hours on a weekend day"""
-    if activity.timestamp.weekday() not in [5, 6]:  # Saturday = 5, Sunday = 6
+    if stats['activity_weekday'] not in [5, 6]:  # Saturday = 5, Sunday = 6
         return False
-    
-    # Get all activities from the same day
-    activity_date = activity.timestamp.date()
-    same_day_activities = [
-        a for a in user_activities 
-        if a.timestamp.date() == activity_date
-    ]
-    
-    total_minutes = sum(a.duration_minutes or 30 for a in same_day_activities)
-    return total_minutes >= 300  # 5 hours = 300 minutes
+    return stats['activity_day_minutes'] >= 300  # 5 hours = 300 minutes
 
 
-def check_iron_streak(activity, user_activities: List) -> bool:
+def check_iron_streak(stats: Dict[str, int]) -> bool:
     """Check if user has logged activities for 7 consecutive days"""
-    if len(user_activities) < 7:
-        return False
-    
-    # Get unique dates with activities
-    dates_with_activities = set(a.timestamp.date() for a in user_activities)
-    
-    # Check for 7 consecutive days ending today
-    today = datetime.utcnow().date()
-    for i in range(7):
-        check_date = today - timedelta(days=i)
-        if check_date not in dates_with_activities:
-            return False
-    
-    return True
+    # 7 consecutive days ending today == 7 distinct active dates in the last 7 days
+    return stats['active_days_last_week'] >= 7
 
 
-def check_centurion(activity, user_activities: List) -> bool:
+def check_centurion(stats: Dict[str, int]) -> bool:
     """Check if user has logged 100 total activities"""
-    return len(user_activities) >= 100
+    return stats['total_activities'] >= 100
 
 
-def check_first_steps(activity, user_activities: List) -> bool:
+def check_first_steps(stats: Dict[str, int]) -> bool:
     """Check if this is the user's first activity"""
-    return len(user_activities) == 1
+    return stats['total_activities'] == 1
 
 
-def check_focused_mind(activity, user_activities: List) -> bool:
+def check_focused_mind(stats: Dict[str, int]) -> bool:
     """Check if user has completed 10 focus sessions"""
-    focus_count = sum(1 for a in user_activities if a.is_focus_session)
-    return focus_count >= 10
+    return stats['focus_sessions'] >= 10
 
 
-def check_career_champion(activity, user_activities: List) -> bool:
+def check_career_champion(stats: Dict[str, int]) -> bool:
     """Check if user has logged 50 hours of Career activities"""
-    from models import CategoryEnum
-    career_activities = [a for a in user_activities if a.category == CategoryEnum.CAREER]
-    total_minutes = sum(a.duration_minutes or 30 for a in career_activities)
-    return total_minutes >= 3000  # 50 hours
+    return stats['career_minutes'] >= 3000  # 50 hours
 
 
-def check_health_hero(activity, user_activities: List) -> bool:
+def check_health_hero(stats: Dict[str, int]) -> bool:
     """Check if user has logged 30 hours of Health activities"""
-    from models import CategoryEnum
-    health_activities = [a for a in user_activities if a.category == CategoryEnum.HEALTH]
-    total_minutes = sum(a.duration_minutes or 30 for a in health_activities)
-    return total_minutes >= 1800  # 30 hours
+    return stats['health_minutes'] >= 1800  # 30 hours
 
 
-def check_social_butterfly(activity, user_activities: List) -> bool:
+def check_social_butterfly(stats: Dict[str, int]) -> bool:
     """Check if user has logged 20 hours of Social activities"""
-    from models import CategoryEnum
-    social_activities = [a for a in user_activities if a.category == CategoryEnum.SOCIAL]
-    total_minutes = sum(a.duration_minutes or 30 for a in social_activities)
-    return total_minutes >= 1200  # 20 hours
+    return stats['social_minutes'] >= 1200  # 20 hours
+
+
+# Badge definitions never change after seeding: serialized dicts are cached per process
+_badge_dict_cache: Dict[int, Dict[str, Any]] = {}
+
+
+def get_badge_dicts(session: SQLSession, badge_ids) -> Dict[int, Dict[str, Any]]:
+    """
+    Return {badge_id: badge.to_dict()} covering badge_ids, loading only ids not cached yet.
+    """
+    missing = [badge_id for badge_id in set(badge_ids) if badge_id not in _badge_dict_cache]
+    if missing:
+        for badge in session.query(Badge).filter(Badge.id.in_(missing)):
+            _badge_dict_cache[badge.id] = badge.to_dict()
+    return _badge_dict_cache
 
 
 # Map badge names to check functions
@@ -286,73 +334,114 @@ BADGE_CHECKS = {
     "Social Butterfly": check_social_butterfly
 }
 
+# Badges whose checks need the user's local hour: check_fn(activity, local_hour).
+# Every other check is judged from activity totals: check_fn(_badge_stats() snapshot)
+TIMEZONE_AWARE_BADGES = {"Night Owl", "Early Bird"}
+
+# Cheap activity features (a bit mask computed once per activity) that a badge
+# can require before its check is called at all
+FEATURE_NIGHT = 1    # local hour >= 22 or < 4
+FEATURE_EARLY = 2    # local hour < 7
+FEATURE_WEEKEND = 4  # Saturday or Sunday
+
+BADGE_REQUIRED_FEATURES = {
+    "Night Owl": FEATURE_NIGHT,
+    "Early Bird": FEATURE_EARLY,
+    "Weekend Warrior": FEATURE_WEEKEND,
+}
+
+
+def _activity_features(activity, local_hour: int = None) -> int:
+    """FEATURE_* bits for the activity (hour falls back to the UTC timestamp)"""
+    hour = local_hour if local_hour is not None else activity.timestamp.hour
+    return (
+        (FEATURE_NIGHT if hour >= 22 or hour < 4 else 0)
+        | (FEATURE_EARLY if hour < 7 else 0)
+        | (FEATURE_WEEKEND if activity.timestamp.weekday() >= 5 else 0)
+    )
+
+
+# BADGE_CHECKS resolved against the seeded badges once per process:
+# (badge_name, badge_id, check_fn, needs_tz, required_features, badge_dict) per badge
+_badge_plan: tuple = ()
+
+
+def _get_badge_plan(session: SQLSession) -> tuple:
+    """Return the badge plan, querying only until the badges have been seeded."""
+    global _badge_plan
+    if not _badge_plan:
+        badge_ids = dict(session.execute(select(Badge.name, Badge.id)).all())
+        badge_dicts = get_badge_dicts(session, badge_ids.values())
+        _badge_plan = tuple(
+            (name, badge_ids[name], check_fn, name in TIMEZONE_AWARE_BADGES,
+             BADGE_REQUIRED_FEATURES.get(name, 0), badge_dicts[badge_ids[name]])
+            for name, check_fn in BADGE_CHECKS.items()
+            if name in badge_ids
+        )
+    return _badge_plan
+
+
+def reset_badge_cache():
+    """Drop the cached badge plan and dicts (call after (re)seeding badges)."""
+    global _badge_plan
+    _badge_plan = ()
+    _badge_dict_cache.clear()
+
 
 def check_and_award_badges(
     session: SQLSession, 
     user, 
     activity, 
-    user_activities: List,
     local_hour: int = None
 ) -> List[Dict[str, Any]]:
     """
     Check all badge conditions and award any newly earned badges.
+    Only badges not yet earned are checked, and badges tied to the time of day
+    or weekend are skipped outright when the activity lacks that feature; the
+    total-based badges share one stats query, run only if one of them is still
+    a candidate.
     
     Args:
         session: Database session
         user: User model instance
-        activity: The newly logged activity
-        user_activities: All of the user's activities (including the new one)
+        activity: The newly logged activity (already flushed)
         local_hour: User's local hour (0-23) for timezone-aware badges
         
     Returns:
         List of newly awarded badges
     """
-    from models import Badge, UserBadge
-    
-    # Get user's existing badges
-    existing_badge_ids = set(ub.badge_id for ub in user.badges)
-    
-    # Get all badges from DB
-    all_badges = session.query(Badge).all()
-    badge_map = {b.name: b for b in all_badges}
+    # Get user's existing badge ids (just the column, not UserBadge objects via user.badges)
+    existing_badge_ids = set(session.scalars(select(UserBadge.badge_id).where(UserBadge.user_id == user.id)))
     
     newly_awarded = []
-    
-    # Badges that need local_hour
-    timezone_aware_badges = {"Night Owl", "Early Bird"}
-    
-    for badge_name, check_fn in BADGE_CHECKS.items():
-        badge = badge_map.get(badge_name)
-        if not badge:
-            continue
-            
-        # Skip if already earned
-        if badge.id in existing_badge_ids:
+    pending_rows = []
+    stats = None
+    now = request_now()
+    features = _activity_features(activity, local_hour)
+    
+    for badge_name, badge_id, check_fn, needs_tz, required, badge_dict in _get_badge_plan(session):
+        # Skip if already earned, or if the activity can't possibly qualify
+        if badge_id in existing_badge_ids or (required and not features & required):
             continue
         
-        # Check if badge condition is met
-        try:
+        # Check if badge condition is met. Errors propagate to the caller, which rolls
+        # back the whole activity: a failed query has already aborted the transaction
+        if needs_tz:
             # Pass local_hour for timezone-aware badges
-            if badge_name in timezone_aware_badges:
-                met = check_fn(activity, user_activities, local_hour)
-            else:
-                met = check_fn(activity, user_activities)
-            
-            if met:
-                # Award the badge
-                user_badge = UserBadge(
-                    user_id=user.id,
-                    badge_id=badge.id,
-                    earned_at=datetime.utcnow()
-                )
-                session.add(user_badge)
-                newly_awarded.append(badge.to_dict())
-        except Exception as e:
-            print(f"Error checking badge {badge_name}: {e}")
-            continue
+            met = check_fn(activity, local_hour)
+        else:
+            if stats is None:
+                stats = _badge_stats(session, user.id, activity)
+            met = check_fn(stats)
+        
+        if met:
+            # Award the badge (inserted together after the loop)
+            pending_rows.append({"user_id": user.id, "badge_id": badge_id, "earned_at": now})
+            newly_awarded.append(badge_dict)
     
-    if newly_awarded:
-        session.commit()
+    if pending_rows:
+        # One executemany for all newly earned badges
+        session.execute(UserBadge.__table__.insert(), pending_rows)
     
     return newly_awarded
 
@@ -361,17 +450,17 @@ def process_activity_gamification(
     session: SQLSession,
     user,
     activity,
-    user_activities: List,
     local_hour: int = None
 ) -> Dict[str, Any]:
     """
     Process all gamification for a new activity.
+    Does not commit: XP, badges and goal adjustments land in the caller's
+    transaction together with the activity itself.
     
     Args:
         session: Database session
         user: User model instance
-        activity: The newly logged activity
-        user_activities: All user activities including the new one
+        activity: The newly logged activity (already flushed)
         local_hour: User's local hour (0-23) for timezone-aware badges
         
     Returns:
@@ -382,7 +471,7 @@ def process_activity_gamification(
     xp_result = award_xp(session, user, xp_gain)
     
     # Check for new badges (pass local_hour for timezone-aware checks)
-    new_badges = check_and_award_badges(session, user, activity, user_activities, local_hour)
+    new_badges = check_and_award_badges(session, user, activity, local_hour)
     
     # Check goal status for penalties/bonuses
     goal_result = check_goal_status(session, user, activity)
@@ -395,6 +484,25 @@ def process_activity_gamification(
     }
 
 
+# Verb prefixes dropped from goal titles before matching ("Limit gaming" -> "gaming")
+GOAL_TITLE_PREFIX_RE = re.compile(r'^(?:limit|reduce|avoid|stop|less|target|achieve) ')
+
+
+def goal_match_title(title: str) -> str:
+    """Lowercased goal title without its leading verb prefix, as used for activity matching."""
+    return GOAL_TITLE_PREFIX_RE.sub('', title.lower(), count=1)
+
+
+@lru_cache(maxsize=256)
+def _goal_title_pattern(title_lower: str) -> "re.Pattern":
+    """
+    One compiled alternation for a goal title: matches activity names containing the
+    whole title or any of its words longer than 3 characters.
+    """
+    alternatives = [title_lower] + [word for word in title_lower.split() if len(word) > 3]
+    return re.compile('|'.join(map(re.escape, alternatives)))
+
+
 def check_goal_status(session: SQLSession, user, activity) -> Dict[str, Any]:
     """
     Check if activity pushes user over goal limits or helps complete goals.
@@ -403,57 +511,59 @@ def check_goal_status(session: SQLSession, user, activity) -> Dict[str, Any]:
     Returns:
         Dict with lists of penalties and bonuses applied
     """
-    from models import Goal, ActivityLog, GoalTypeEnum, TimeframeEnum
-    
     penalties = []
     bonuses = []
     
     # Get user's active goals
     goals = session.query(Goal).filter(Goal.user_id == user.id).all()
+    if not goals:
+        return {"penalties": penalties, "bonuses": bonuses}
     
-    today = datetime.utcnow().date()
-    start_of_day = datetime.combine(today, datetime.min.time())
+    today = request_now().date()
     
-    for goal in goals:
-        # Determine timeframe start
-        if goal.timeframe == TimeframeEnum.DAILY:
-            start_date = today
-        elif goal.timeframe == TimeframeEnum.WEEKLY:
-            start_date = today - timedelta(days=today.weekday())
-        else:  # Monthly
-            start_date = today.replace(day=1)
-        
-        start_datetime = datetime.combine(start_date, datetime.min.time())
+    # Determine each goal's timeframe start (anything else counts as monthly)
+    timeframe_starts = {
+        TimeframeEnum.DAILY: today,
+        TimeframeEnum.WEEKLY: today - timedelta(days=today.weekday()),
+        TimeframeEnum.MONTHLY: today.replace(day=1),
+    }
+    start_dates = [
+        timeframe_starts.get(goal.timeframe, timeframe_starts[TimeframeEnum.MONTHLY])
+        for goal in goals
+    ]
+    
+    # One aggregate over the widest window, instead of a query per goal: minutes per
+    # (category, day, activity name). Each goal then sums the groups inside its own window.
+    day = func.date(ActivityLog.timestamp, type_=Date)
+    minute_groups = session.execute(
+        select(
+            ActivityLog.category, day, ActivityLog.activity_name,
+            func.sum(func.coalesce(ActivityLog.duration_minutes, 30))
+        ).where(
+            ActivityLog.user_id == user.id,
+            ActivityLog.category.in_({goal.category for goal in goals}),
+            ActivityLog.timestamp >= datetime.combine(min(start_dates), datetime.min.time())
+        ).group_by(ActivityLog.category, day, ActivityLog.activity_name)
+    ).all()
+    
+    for goal, start_date in zip(goals, start_dates):
+        groups = [
+            (name, minutes) for category, group_day, name, minutes in minute_groups
+            if category == goal.category and group_day >= start_date
+        ]
         
         # Get activities matching this goal
         if goal.title:
             # Smart matching by title
-            title_lower = goal.title.lower()
-            for prefix in ['limit ', 'reduce ', 'avoid ', 'stop ', 'less ', 'target ', 'achieve ']:
-                if title_lower.startswith(prefix):
-                    title_lower = title_lower[len(prefix):]
-                    break
+            title_lower = goal_match_title(goal.title)
             
-            all_category_activities = session.query(ActivityLog).filter(
-                ActivityLog.user_id == user.id,
-                ActivityLog.category == goal.category,
-                ActivityLog.timestamp >= start_datetime
-            ).all()
-            
-            activities = [
-                a for a in all_category_activities
-                if title_lower in a.activity_name.lower() or 
-                   a.activity_name.lower() in title_lower or
-                   any(word in a.activity_name.lower() for word in title_lower.split() if len(word) > 3)
+            title_pattern = _goal_title_pattern(title_lower)
+            groups = [
+                (name, minutes) for name, minutes in groups
+                if title_pattern.search(name.lower()) or name.lower() in title_lower
             ]
-        else:
-            activities = session.query(ActivityLog).filter(
-                ActivityLog.user_id == user.id,
-                ActivityLog.category == goal.category,
-                ActivityLog.timestamp >= start_datetime
-            ).all()
         
-        total_minutes = sum(a.duration_minutes or 30 for a in activities)
+        total_minutes = sum(minutes for _, minutes in groups)
         hours_logged = total_minutes / 60
         
         is_limit_goal = goal.goal_type == GoalTypeEnum.LIMIT if goal.goal_type else False
@@ -505,9 +615,6 @@ def check_goal_status(session: SQLSession, user, activity) -> Dict[str, Any]:
                         "reason": "Goal completed!"
                     })
     
-    if penalties or bonuses:
-        session.commit()
-    
     return {
         "penalties": penalties,
         "bonuses": bonuses
@@ -531,14 +638,12 @@ def calculate_streak(session: SQLSession, user_id: int, tz_offset: int = 0) -> D
     Returns:
         Dict with current_streak, longest_streak, and streak details
     """
-    from models import ActivityLog
-    
-    # Get all user activities ordered by date
-    activities = session.query(ActivityLog).filter(
-        ActivityLog.user_id == user_id
-    ).order_by(ActivityLog.timestamp.desc()).all()
+    # Only the timestamps are needed: no ActivityLog objects for the whole history
+    timestamps = session.scalars(
+        select(ActivityLog.timestamp).where(ActivityLog.user_id == user_id)
+    ).all()
     
-    if not activities:
+    if not timestamps:
         return {
             "current_streak": 0,
             "longest_streak": 0,
@@ -553,7 +658,7 @@ def calculate_streak(session: SQLSession, user_id: int, tz_offset: int = 0) -> D
         return local_time.date()
     
     # Get unique LOCAL dates with activities
-    dates_with_activities = sorted(set(to_local_date(a.timestamp) for a in activities), reverse=True)
+    dates_with_activities = sorted(set(to_local_date(ts) for ts in timestamps), reverse=True)
     
     if not dates_with_activities:
         return {
@@ -564,7 +669,7 @@ def calculate_streak(session: SQLSession, user_id: int, tz_offset: int = 0) -> D
         }
     
     # Calculate "today" in user's local timezone
-    utc_now = datetime.utcnow()
+    utc_now = request_now()
     local_now = utc_now - timedelta(minutes=tz_offset)
     today = local_now.date()
     yesterday = today - timedelta(days=1)
@@ -609,7 +714,6 @@ def calculate_streak(session: SQLSession, user_id: int, tz_offset: int = 0) -> D
 # COLLECTIBLES / LOOT SYSTEM (Phase 4)
 # ============================================================================
 
-import random
 
 # Item definitions - 20 items across 4 rarities (Tech Relic Theme)
 # icon_name should match Lucide React component names
@@ -643,46 +747,75 @@ ITEM_DEFINITIONS = [
     {"name": "The Singularity", "rarity": "Mythic", "icon_name": "Sparkles", "description": "The moment when productivity becomes infinite."},
 ]
 
-# Rarity weights for loot drops (CS:GO style)
-RARITY_WEIGHTS = {
-    "Common": 60,      # 60%
-    "Rare": 25,        # 25%  
-    "Legendary": 10,   # 10%
-    "Mythic": 5,       # 5%
-}
+# Rarity weights for loot drops (CS:GO style), rarest last; everything else derives from this
+RARITIES = (
+    ("Common", 60),      # 60%
+    ("Rare", 25),        # 25%
+    ("Legendary", 10),   # 10%
+    ("Mythic", 5),       # 5%
+)
+RARITY_ORDER = tuple(rarity for rarity, _ in RARITIES)
+RARITY_WEIGHTS = dict(RARITIES)
 
 
 def seed_items(session: SQLSession):
-    """Seed all item definitions into the database"""
-    from models import Item, RarityEnum
-    
-    for item_def in ITEM_DEFINITIONS:
-        existing = session.query(Item).filter_by(name=item_def["name"]).first()
-        if existing:
-            continue
-        
-        item = Item(
-            name=item_def["name"],
-            rarity=RarityEnum[item_def["rarity"].upper()],
-            icon_name=item_def["icon_name"],
-            description=item_def["description"]
-        )
-        session.add(item)
+    """Seed all item definitions into the database (one INSERT ... ON CONFLICT (name) DO NOTHING)"""
+    insert = sqlite.insert if session.get_bind().dialect.name == 'sqlite' else postgresql.insert
+    inserted_ids = session.scalars(
+        insert(Item)
+        .values([
+            {
+                "name": item_def["name"],
+                "rarity": RarityEnum[item_def["rarity"].upper()],
+                "icon_name": item_def["icon_name"],
+                "description": item_def["description"]
+            }
+            for item_def in ITEM_DEFINITIONS
+        ])
+        .on_conflict_do_nothing(index_elements=[Item.name])
+        .returning(Item.id)
+    ).all()
     
     session.commit()
+    if inserted_ids:
+        # New catalogue entries: drop the cached item dicts
+        _item_dict_cache.clear()
+        _loot_table.clear()
     return len(ITEM_DEFINITIONS)
 
 
-# Explicit ordered rarity list to ensure weight alignment  
-RARITY_ORDER = ["Common", "Rare", "Legendary", "Mythic"]
-RARITY_WEIGHT_LIST = [60, 25, 10, 5]  # Must match RARITY_ORDER
+# Item definitions never change after seeding: serialized dicts are cached per process
+_item_dict_cache: Dict[int, Dict[str, Any]] = {}
+# Flat item list + running sum of per-item drop weights, for one-draw chest opens
+_loot_table: List[Any] = []
+
 
+def get_item_dicts(session: SQLSession) -> Dict[int, Dict[str, Any]]:
+    """
+    Return {item_id: item.to_dict()} for the whole catalogue (in id order),
+    querying only until the items have been seeded.
+    """
+    if not _item_dict_cache:
+        for item in session.query(Item).order_by(Item.id):
+            _item_dict_cache[item.id] = item.to_dict()
+    return _item_dict_cache
 
-def get_random_rarity() -> str:
-    """Get a random rarity based on weights using explicit ordering"""
-    # Use random.choices with aligned lists for guaranteed correctness
-    result = random.choices(RARITY_ORDER, weights=RARITY_WEIGHT_LIST, k=1)[0]
-    return result
+
+def _get_loot_table(session: SQLSession) -> tuple:
+    """
+    Return (items, cumulative weights) built from the cached catalogue.
+    Each item weighs RARITY_WEIGHTS[rarity] / (items of that rarity), so a rarity's
+    total drop chance doesn't depend on how many items it has, and rarities with
+    no items simply drop out of the draw.
+    """
+    if not _loot_table:
+        items = list(get_item_dicts(session).values())
+        per_rarity = {}
+        for item in items:
+            per_rarity[item["rarity"]] = per_rarity.get(item["rarity"], 0) + 1
+        weights = [RARITY_WEIGHTS.get(item["rarity"], 0) / per_rarity[item["rarity"]] for item in items]
+        _loot_table[:] = [items, list(accumulate(weights))]
+    return tuple(_loot_table)
 
 
 def open_chest(session: SQLSession, user) -> Dict[str, Any]:
@@ -697,62 +830,87 @@ def open_chest(session: SQLSession, user) -> Dict[str, Any]:
     Returns:
         Dict with item info and whether it's a new item
     """
-    from models import Item, UserItem, RarityEnum
-    
-    # Check if user has credits
-    if (user.chest_credits or 0) <= 0:
-        return {"error": "No keys available", "credits_required": True}
-    
-    # Deduct 1 credit
-    user.chest_credits = (user.chest_credits or 0) - 1
-    
-    # Get random rarity
-    rarity = get_random_rarity()
-    rarity_enum = RarityEnum[rarity.upper()]
-    
-    # Get all items of that rarity
-    items = session.query(Item).filter_by(rarity=rarity_enum).all()
+    result = open_chests(session, user, 1)
+    if "error" in result:
+        return result
+    return result["drops"][0]
+
+
+def open_chests(session: SQLSession, user, n: int) -> Dict[str, Any]:
+    """
+    Open n loot chests at once: one credit UPDATE, one upsert, one commit.
+    Requires n chest credits.
     
-    if not items:
-        # Fallback to any item
-        items = session.query(Item).all()
+    Args:
+        session: Database session
+        user: User model instance
+        n: Number of chests to open
+        
+    Returns:
+        Dict with one entry per chest in "drops" (item, is_new, count, rarity)
+    """
+    if n < 1:
+        return {"error": "Must open at least one chest"}
     
-    if not items:
-        # Refund credit if no items
-        user.chest_credits = (user.chest_credits or 0) + 1
+    # Nothing to award: bail out before touching any rows
+    items, cum_weights = _get_loot_table(session)
+    if not items or not cum_weights[-1]:
         return {"error": "No items available"}
     
-    # Pick random item
-    item = random.choice(items)
-    
-    # Check if user already has this item
-    user_item = session.query(UserItem).filter_by(
-        user_id=user.id,
-        item_id=item.id
-    ).first()
-    
-    is_new = user_item is None
-    
-    if user_item:
-        # Increment count
-        user_item.count += 1
-    else:
-        # Add new item to user's collection
-        user_item = UserItem(
-            user_id=user.id,
-            item_id=item.id,
-            count=1
+    # Check and deduct n credits in one conditional UPDATE, so two concurrent
+    # opens can't both spend the same last credits
+    remaining_credits = session.execute(
+        update(User)
+        .where(User.id == user.id, User.chest_credits >= n)
+        .values(chest_credits=User.chest_credits - n)
+        .returning(User.chest_credits)
+        .execution_options(synchronize_session=False)
+    ).scalar()
+    if remaining_credits is None:
+        return {"error": "No keys available", "credits_required": True}
+    set_committed_value(user, 'chest_credits', remaining_credits)
+    
+    # One weighted draw per chest over the whole catalogue (binary search of the running sums)
+    total_weight = cum_weights[-1]
+    last_index = len(items) - 1
+    rand, search = random.random, bisect.bisect  # Bound once for the draw loop
+    drawn = [
+        items[min(search(cum_weights, rand() * total_weight), last_index)]
+        for _ in range(n)
+    ]
+    drawn_counts = Counter(item["id"] for item in drawn)
+    
+    # Add everything to the user's collection in one upsert, bumping existing counts
+    insert = sqlite.insert if session.get_bind().dialect.name == 'sqlite' else postgresql.insert
+    stmt = insert(UserItem).values([
+        {"user_id": user.id, "item_id": item_id, "count": k,
+         "first_obtained_at": request_now(), "is_broken": False}
+        for item_id, k in drawn_counts.items()
+    ])
+    final_counts = dict(session.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[UserItem.user_id, UserItem.item_id],
+            set_={"count": UserItem.count + stmt.excluded.count}
         )
-        session.add(user_item)
+        .returning(UserItem.item_id, UserItem.count)
+    ).all())
     
     session.commit()
     
-    return {
-        "item": item.to_dict(),
-        "is_new": is_new,
-        "count": user_item.count,
-        "rarity": rarity
-    }
+    # Replay the draws in order so each one reports the count it brought the item to
+    running = {item_id: final_counts[item_id] - k for item_id, k in drawn_counts.items()}
+    drops = []
+    for item in drawn:
+        running[item["id"]] += 1
+        count = running[item["id"]]
+        drops.append({
+            "item": item,
+            "is_new": count == 1,
+            "count": count,
+            "rarity": item["rarity"]
+        })
+    
+    return {"drops": drops}
 
 
 def check_chest_eligibility(session: SQLSession, user) -> Dict[str, Any]:
@@ -762,22 +920,16 @@ def check_chest_eligibility(session: SQLSession, user) -> Dict[str, Any]:
     Returns:
         Dict with eligibility status and productive hours
     """
-    from models import ActivityLog, CategoryEnum
-    
     # Get today's activities
-    today = datetime.utcnow().date()
+    today = request_now().date()
     start_of_day = datetime.combine(today, datetime.min.time())
     
-    activities = session.query(ActivityLog).filter(
-        ActivityLog.user_id == user.id,
-        ActivityLog.timestamp >= start_of_day
-    ).all()
-    
-    # Count productive minutes (Career and Health categories)
-    productive_minutes = 0
-    for activity in activities:
-        if activity.category in [CategoryEnum.CAREER, CategoryEnum.HEALTH]:
-            productive_minutes += activity.duration_minutes or 30
+    # Sum productive minutes (Career and Health categories) in SQL
+    productive_minutes = _activity_minutes(
+        session, user.id,
+        ActivityLog.timestamp >= start_of_day,
+        ActivityLog.category.in_([CategoryEnum.CAREER, CategoryEnum.HEALTH])
+    )
     
     productive_hours = productive_minutes / 60
     eligible = productive_hours >= 2.0
@@ -798,6 +950,7 @@ def check_item_decay(session: SQLSession, user) -> Optional[Dict[str, Any]]:
     """
     Check if user has exceeded their gaming limit and break their rarest item.
     This creates loss aversion by punishing excessive leisure time.
+    Does not commit, like the other per-activity gamification steps.
     
     Args:
         session: Database session
@@ -806,36 +959,37 @@ def check_item_decay(session: SQLSession, user) -> Optional[Dict[str, Any]]:
     Returns:
         Dict with broken item info if decay occurred, None otherwise
     """
-    from models import UserItem, Item, RarityEnum
-    
     # Check if user has exceeded their gaming limit
     if user.today_gaming_minutes <= user.daily_gaming_allowance:
         return None
     
-    # Rarity priority: Mythic > Legendary > Rare > Common
-    rarity_priority = [RarityEnum.MYTHIC, RarityEnum.LEGENDARY, RarityEnum.RARE, RarityEnum.COMMON]
-    
-    # Find the rarest unbroken item
-    for rarity in rarity_priority:
-        user_item = session.query(UserItem).join(Item).filter(
+    # Rarest unbroken item first: Mythic > Legendary > Rare > Common
+    rarity_priority = case(
+        (Item.rarity == RarityEnum.MYTHIC, 0),
+        (Item.rarity == RarityEnum.LEGENDARY, 1),
+        (Item.rarity == RarityEnum.RARE, 2),
+        else_=3
+    )
+    user_item = session.scalars(
+        select(UserItem).join(Item).where(
             UserItem.user_id == user.id,
-            UserItem.is_broken == False,
-            Item.rarity == rarity
-        ).first()
+            UserItem.is_broken == False
+        ).order_by(rarity_priority, UserItem.id).limit(1)
+    ).first()
+    
+    if user_item:
+        # Break this item (the caller commits)
+        user_item.is_broken = True
         
-        if user_item:
-            # Break this item
-            user_item.is_broken = True
-            session.commit()
-            
-            return {
-                "broken": True,
-                "item_id": user_item.id,
-                "item_name": user_item.item.name,
-                "item_emoji": user_item.item.image_emoji,
-                "rarity": user_item.item.rarity.value,
-                "message": f"⚠️ Limit Exceeded: Your {user_item.item.name} has broken!"
-            }
+        item = get_item_dicts(session)[user_item.item_id]
+        return {
+            "broken": True,
+            "item_id": user_item.id,
+            "item_name": item["name"],
+            "icon_name": item["icon_name"],
+            "rarity": item["rarity"],
+            "message": f"⚠️ Limit Exceeded: Your {item['name']} has broken!"
+        }
     
     # No items to break
     return None
@@ -853,8 +1007,6 @@ def repair_item(session: SQLSession, user, user_item_id: int) -> Dict[str, Any]:
     Returns:
         Dict with repair result
     """
-    from models import UserItem
-    
     REPAIR_COST = 5  # Credits required to repair
     
     # Find the user's item
@@ -882,10 +1034,11 @@ def repair_item(session: SQLSession, user, user_item_id: int) -> Dict[str, Any]:
     user_item.is_broken = False
     session.commit()
     
+    item_name = get_item_dicts(session)[user_item.item_id]["name"]
     return {
         "success": True,
-        "item_name": user_item.item.name,
+        "item_name": item_name,
         "credits_spent": REPAIR_COST,
         "remaining_credits": user.chest_credits,
-        "message": f"✨ {user_item.item.name} has been repaired!"
+        "message": f"✨ {item_name} has been repaired!"
     }
@@ -0,0 +1,31 @@
+"""
+FocusFlow - JSON Provider
+orjson-backed replacement for Flask's default JSON provider.
+Every jsonify() call goes through this, so no call-site changes are needed.
+"""
+
+import orjson
+from flask.json.provider import JSONProvider
+
+
+# Non-string dict keys and NumPy scalars (from the pandas/sklearn analytics) are
+# serialized the same way the stdlib provider handled them. datetimes are written
+# natively as ISO 8601 (naive ones exactly like isoformat(); aware UTC ones with "Z").
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_UTC_Z
+
+
+class OrjsonProvider(JSONProvider):
+    """Serialize responses with orjson (~3-5x faster than stdlib json)."""
+
+    mimetype = 'application/json'
+
+    def dumps(self, obj, **kwargs) -> str:
+        return orjson.dumps(obj, option=ORJSON_OPTIONS).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        """jsonify(): hand orjson's bytes straight to the response, no str round-trip."""
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(orjson.dumps(obj, option=ORJSON_OPTIONS), mimetype=self.mimetype)
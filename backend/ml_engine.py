@@ -6,14 +6,16 @@ This module analyzes user activity patterns to identify distinct "Work Modes"
 and provides actionable insights based on the clustering results.
 """
 
+import hashlib
 import numpy as np
-import pandas as pd
-from sklearn.cluster import KMeans
-from sklearn.preprocessing import StandardScaler
-from typing import List, Dict, Any, Optional
+from sklearn.cluster import KMeans, MiniBatchKMeans
+from typing import Iterable, List, Dict, Any, Optional
 from datetime import datetime, timedelta
 
 
+# Above this many activities, cluster with MiniBatchKMeans instead of full KMeans
+MINIBATCH_THRESHOLD = 2000
+
 # Work Mode Archetypes
 WORK_MODES = {
     'deep_focus': {
@@ -43,6 +45,10 @@ WORK_MODES = {
 }
 
 
+# classify_cluster truth table, indexed by (high_duration << 1) | high_score
+_MODE_BY_QUADRANT = ('distracted', 'quick_wins', 'burnout_zone', 'deep_focus')
+
+
 def classify_cluster(avg_duration: float, avg_score: float, 
                      duration_median: float, score_median: float) -> str:
     """
@@ -57,46 +63,72 @@ def classify_cluster(avg_duration: float, avg_score: float,
     """
     high_duration = avg_duration > duration_median
     high_score = avg_score > score_median
+    return _MODE_BY_QUADRANT[(high_duration << 1) | high_score]
+
+
+# Cluster labels of recent fits, keyed by (feature digest, shape, n_clusters); oldest evicted first
+_CLUSTER_CACHE_MAX_ENTRIES = 128
+_cluster_cache: Dict[tuple, np.ndarray] = {}
+
+
+def _fit_clusters(features: np.ndarray, n_clusters: int) -> np.ndarray:
+    """
+    Scale the (duration, score) rows and K-Means them into n_clusters.
+    Memoised on a 16-byte digest of the features: with a fixed random_state the
+    same data always gets the same labels, so unchanged activity lists skip the refit.
+    
+    Returns:
+        Read-only array of cluster ids, one per row
+    """
+    cache_key = (hashlib.blake2b(features.tobytes(), digest_size=16).digest(), features.shape, n_clusters)
+    cached = _cluster_cache.get(cache_key)
+    if cached is not None:
+        return cached
     
-    if high_duration and high_score:
-        return 'deep_focus'
-    elif not high_duration and high_score:
-        return 'quick_wins'
-    elif high_duration and not high_score:
-        return 'burnout_zone'
+    # CRITICAL: Scale features so duration doesn't dominate score
+    # (z-scores, same as StandardScaler: population std, constant columns left at 0)
+    mean = features.mean(axis=0)
+    std = features.std(axis=0)
+    std[std == 0] = 1.0
+    features_scaled = (features - mean) / std
+    
+    # 2-D data converges from a few seeds; Elkan's triangle-inequality bounds skip
+    # most distance computations. Very large histories use mini-batches instead.
+    if len(features) > MINIBATCH_THRESHOLD:
+        kmeans = MiniBatchKMeans(n_clusters=n_clusters, random_state=42, batch_size=256, n_init=3)
     else:
-        return 'distracted'
+        kmeans = KMeans(n_clusters=n_clusters, random_state=42, n_init=3, algorithm="elkan")
+    cluster_ids = kmeans.fit_predict(features_scaled)
+    cluster_ids.flags.writeable = False  # Shared between cache hits
+    if len(_cluster_cache) >= _CLUSTER_CACHE_MAX_ENTRIES:
+        _cluster_cache.pop(next(iter(_cluster_cache), None), None)
+    _cluster_cache[cache_key] = cluster_ids
+    return cluster_ids
 
 
-def analyze_work_modes(activities: List[Any]) -> Dict[str, Any]:
+def analyze_work_modes(activities: Iterable[Any]) -> Dict[str, Any]:
     """
     Analyze user activities using K-Means clustering to identify Work Modes.
     
     Args:
-        activities: List of ActivityLog objects
+        activities: Iterable of ActivityLog rows (e.g. a yield_per query), read once
         
     Returns:
         Dict with chart_data, cluster_info, and insight
     """
-    # Minimum data check
-    if len(activities) < 5:
-        return {
-            'has_data': False,
-            'message': 'Need at least 5 activities for Work Mode analysis',
-            'chart_data': [],
-            'clusters': [],
-            'insight': None
-        }
-    
     # Step A: Data Preparation
     # IMPORTANT: Only analyze productive activities (Career, Health, Chores, Education)
     # Exclude Leisure and Social as they pollute work session analysis
     PRODUCTIVE_CATEGORIES = {'career', 'health', 'chores', 'education'}
     
-    data = []
+    total_activities = 0
+    durations = []
+    scores = []
+    meta = []  # (activity, category) per kept activity, parallel to durations/scores
     for act in activities:
+        total_activities += 1
         duration = act.duration_minutes or 0
-        score = act.productivity_score or 0
+        score = act.productivity_score or 0.0
         category = act.category.value.lower() if hasattr(act.category, 'value') else str(act.category).lower()
         
         # Skip activities with no duration
@@ -106,17 +138,23 @@ def analyze_work_modes(activities: List[Any]) -> Dict[str, Any]:
         # Skip leisure and social activities - they shouldn't be in work analysis
         if category not in PRODUCTIVE_CATEGORIES:
             continue
-            
-        data.append({
-            'id': act.id,
-            'activity': act.activity_name or act.raw_input[:30],
-            'duration': duration,
-            'score': score,
-            'category': category.capitalize(),
-            'timestamp': act.timestamp.isoformat() if act.timestamp else None
-        })
+        
+        durations.append(duration)
+        scores.append(score)
+        meta.append((act.activity_name or act.raw_input[:30], category.capitalize()))
     
-    if len(data) < 5:
+    # Minimum data check
+    if total_activities < 5:
+        return {
+            'has_data': False,
+            'message': 'Need at least 5 activities for Work Mode analysis',
+            'chart_data': [],
+            'clusters': [],
+            'insight': None
+        }
+    
+    n_points = len(meta)
+    if n_points < 5:
         return {
             'has_data': False,
             'message': 'Need at least 5 activities with duration for analysis',
@@ -125,58 +163,46 @@ def analyze_work_modes(activities: List[Any]) -> Dict[str, Any]:
             'insight': None
         }
     
-    df = pd.DataFrame(data)
+    duration_arr = np.array(durations, dtype=np.float64)
+    score_arr = np.array(scores, dtype=np.float64)
     
     # Step B: Clustering with K-Means
-    # CRITICAL: Scale features so duration doesn't dominate score
-    features = df[['duration', 'score']].values
-    scaler = StandardScaler()
-    features_scaled = scaler.fit_transform(features)
-    
     # Determine optimal number of clusters (max 3, min 2)
-    n_clusters = min(3, len(df) // 3)  # At least 3 points per cluster
+    n_clusters = min(3, n_points // 3)  # At least 3 points per cluster
     n_clusters = max(2, n_clusters)
     
-    kmeans = KMeans(n_clusters=n_clusters, random_state=42, n_init=10)
-    df['cluster_id'] = kmeans.fit_predict(features_scaled)
+    features = np.column_stack((duration_arr, score_arr))
+    cluster_ids = _fit_clusters(features, n_clusters)
     
     # Step C: Centroid Analysis (Translate to Human Labels)
     # Calculate data-relative thresholds (medians)
-    duration_median = df['duration'].median()
-    score_median = df['score'].median()
-    
-    # Get unscaled centroids for interpretation
-    cluster_stats = df.groupby('cluster_id').agg({
-        'duration': 'mean',
-        'score': 'mean',
-        'id': 'count'
-    }).reset_index()
-    cluster_stats.columns = ['cluster_id', 'avg_duration', 'avg_score', 'count']
-    
-    # Assign Work Mode labels to each cluster using data-relative thresholds
+    duration_median = np.median(duration_arr)
+    score_median = np.median(score_arr)
+    
+    # Get unscaled centroids for interpretation (per-cluster sums / counts)
+    counts = np.bincount(cluster_ids, minlength=n_clusters)
+    duration_sums = np.bincount(cluster_ids, weights=duration_arr, minlength=n_clusters)
+    score_sums = np.bincount(cluster_ids, weights=score_arr, minlength=n_clusters)
+    
+    # Assign Work Mode labels to each (non-empty) cluster using data-relative thresholds
     cluster_labels = {}
-    for _, row in cluster_stats.iterrows():
-        mode_key = classify_cluster(
-            row['avg_duration'], row['avg_score'],
-            duration_median, score_median
-        )
-        cluster_labels[int(row['cluster_id'])] = {
+    for cluster_id in np.flatnonzero(counts):
+        count = int(counts[cluster_id])
+        avg_duration = duration_sums[cluster_id] / count
+        avg_score = score_sums[cluster_id] / count
+        mode_key = classify_cluster(avg_duration, avg_score, duration_median, score_median)
+        cluster_labels[int(cluster_id)] = {
             'mode_key': mode_key,
             **WORK_MODES[mode_key],
-            'avg_duration': round(row['avg_duration'], 1),
-            'avg_score': round(row['avg_score'], 1),
-            'count': int(row['count']),
-            'percentage': round(row['count'] / len(df) * 100, 1)
+            'avg_duration': round(float(avg_duration), 1),
+            'avg_score': round(float(avg_score), 1),
+            'count': count,
+            'percentage': round(count / n_points * 100, 1)
         }
     
-    # Map cluster IDs to labels in dataframe
-    df['cluster_name'] = df['cluster_id'].map(lambda x: cluster_labels[x]['name'])
-    df['cluster_color'] = df['cluster_id'].map(lambda x: cluster_labels[x]['color'])
-    
     # Step D: Insight Generation (The "So What?")
     # Find the dominant mode
-    dominant_cluster_id = cluster_stats.loc[cluster_stats['count'].idxmax(), 'cluster_id']
-    dominant_mode = cluster_labels[int(dominant_cluster_id)]
+    dominant_mode = cluster_labels[int(np.argmax(counts))]
     
     # Generate contextual insight message - clearer and more actionable
     insight_messages = {
@@ -187,7 +213,18 @@ def analyze_work_modes(activities: List[Any]) -> Dict[str, Any]:
     }
     
     # Prepare chart data for frontend
-    chart_data = df[['duration', 'score', 'cluster_name', 'cluster_color', 'activity', 'category']].to_dict('records')
+    chart_data = [
+        {
+            'duration': duration,
+            'score': score,
+            'cluster_name': cluster_labels[cluster_id]['name'],
+            'cluster_color': cluster_labels[cluster_id]['color'],
+            'activity': activity,
+            'category': category
+        }
+        for duration, score, cluster_id, (activity, category)
+        in zip(durations, scores, cluster_ids.tolist(), meta)
+    ]
     
     # Prepare cluster summary for legend/stats
     clusters_summary = list(cluster_labels.values())
@@ -204,7 +241,7 @@ def analyze_work_modes(activities: List[Any]) -> Dict[str, Any]:
             'message': insight_messages[dominant_mode['mode_key']],
             'action': dominant_mode['action']
         },
-        'total_activities': len(df)
+        'total_activities': n_points
     }
 
 
@@ -5,10 +5,12 @@ Phase 3: Added gamification (XP, Levels, Badges), Goals, and Social features
 """
 
 from datetime import datetime
-from enum import Enum as PyEnum
-from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, ForeignKey, Enum, Boolean, Text
+from enum import Enum as PyEnum, IntEnum
+from sqlalchemy import create_engine, Column, Integer, SmallInteger, String, Float, DateTime, ForeignKey, Enum, Boolean, Text, Index
+from sqlalchemy.types import TypeDecorator
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import relationship, sessionmaker
+from sqlalchemy.orm import relationship, sessionmaker, scoped_session
 
 Base = declarative_base()
 
@@ -51,10 +53,26 @@ class RarityEnum(PyEnum):
     MYTHIC = "Mythic"
 
 
-class FriendshipStatusEnum(PyEnum):
-    """Status of a friendship request"""
-    PENDING = "pending"
-    ACCEPTED = "accepted"
+class FriendshipStatusEnum(IntEnum):
+    """Status of a friendship request (stored as a SMALLINT for compact indexes)"""
+    PENDING = 0
+    ACCEPTED = 1
+
+
+class IntEnumType(TypeDecorator):
+    """Store an IntEnum as a SMALLINT and hand back enum members on load"""
+    impl = SmallInteger
+    cache_ok = True
+
+    def __init__(self, enum_class, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.enum_class = enum_class
+
+    def process_bind_param(self, value, dialect):
+        return int(value) if value is not None else None
+
+    def process_result_value(self, value, dialect):
+        return self.enum_class(value) if value is not None else None
 
 
 class User(Base):
@@ -96,6 +114,11 @@ class User(Base):
     badges = relationship("UserBadge", back_populates="user", cascade="all, delete-orphan")
     items = relationship("UserItem", back_populates="user", cascade="all, delete-orphan")
 
+    # Leaderboards only scan public users: keep that subset in its own small index
+    __table_args__ = (
+        Index('ix_users_public', 'id', postgresql_where=(is_public == True), sqlite_where=(is_public == True)),
+    )
+
     def __repr__(self):
         return f"<User(id={self.id}, email='{self.email}', name='{self.name}', level={self.level})>"
 
@@ -128,14 +151,14 @@ class ActivityLog(Base):
     __tablename__ = 'activity_logs'
 
     id = Column(Integer, primary_key=True, autoincrement=True)
-    user_id = Column(Integer, ForeignKey('users.id'), nullable=False, index=True)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False)  # Leading column of the composite indexes below
     
     # Raw input from user
     raw_input = Column(String(1000), nullable=False)
     
     # Parsed/analyzed fields
     activity_name = Column(String(255), nullable=False)
-    category = Column(Enum(CategoryEnum), nullable=False, index=True)  # Index for Dashboard/Analytics filtering
+    category = Column(Enum(CategoryEnum), nullable=False)  # Filtered per user via ix_activity_logs_user_id_category_timestamp
     duration_minutes = Column(Integer, nullable=True)
     
     # Scores and analysis
@@ -143,7 +166,7 @@ class ActivityLog(Base):
     productivity_score = Column(Float, nullable=False)  # Changed to Float for weighted scoring
     
     # Focus/flow state detection
-    is_focus_session = Column(Integer, default=0)  # 0 = False, 1 = True
+    is_focus_session = Column(Boolean, default=False, nullable=False)
     
     # Source tracking for future integrations
     source = Column(Enum(SourceEnum), default=SourceEnum.MANUAL, nullable=False)
@@ -154,6 +177,15 @@ class ActivityLog(Base):
     # Relationship to user
     user = relationship("User", back_populates="activities")
 
+    # Per-user time-range scans (dashboard, streaks, export) and per-user category sums
+    # (chest eligibility, badges, goals) each hit one index range;
+    # the weekly leaderboard reads (timestamp, user_id, score) from the covering index alone (Postgres)
+    __table_args__ = (
+        Index('ix_activity_logs_user_id_timestamp', 'user_id', 'timestamp'),
+        Index('ix_activity_logs_user_id_category_timestamp', 'user_id', 'category', 'timestamp'),
+        Index('ix_activity_logs_timestamp_user_id', 'timestamp', 'user_id', postgresql_include=['productivity_score']),
+    )
+
     def __repr__(self):
         return f"<ActivityLog(id={self.id}, activity='{self.activity_name}', category={self.category.value})>"
 
@@ -167,9 +199,9 @@ class ActivityLog(Base):
             "duration_minutes": self.duration_minutes,
             "sentiment_score": self.sentiment_score,
             "productivity_score": self.productivity_score,
-            "is_focus_session": bool(self.is_focus_session),
+            "is_focus_session": self.is_focus_session,
             "source": self.source.value if self.source else "manual",
-            "timestamp": self.timestamp.isoformat() if self.timestamp else None
+            "timestamp": self.timestamp  # Serialized natively by the orjson provider (same ISO format)
         }
 
 
@@ -296,6 +328,14 @@ class UserItem(Base):
     user = relationship("User", back_populates="items")
     item = relationship("Item", back_populates="user_items")
 
+    # One row per (user, item): open_chest upserts on it with ON CONFLICT.
+    # Partial index for item decay, which only looks at a user's unbroken items
+    __table_args__ = (
+        Index('uq_user_items_user_id_item_id', 'user_id', 'item_id', unique=True),
+        Index('ix_user_items_user_id_unbroken', 'user_id',
+              postgresql_where=(is_broken == False), sqlite_where=(is_broken == False)),
+    )
+
     def __repr__(self):
         return f"<UserItem(user_id={self.user_id}, item_id={self.item_id}, count={self.count})>"
 
@@ -318,13 +358,23 @@ class Friendship(Base):
     id = Column(Integer, primary_key=True, autoincrement=True)
     user_id = Column(Integer, ForeignKey('users.id'), nullable=False, index=True)  # Requester
     friend_id = Column(Integer, ForeignKey('users.id'), nullable=False, index=True)  # Receiver
-    status = Column(Enum(FriendshipStatusEnum), default=FriendshipStatusEnum.PENDING, nullable=False)
+    status = Column(IntEnumType(FriendshipStatusEnum), default=FriendshipStatusEnum.PENDING, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
 
     # Relationships
     requester = relationship("User", foreign_keys=[user_id], backref="sent_requests")
     receiver = relationship("User", foreign_keys=[friend_id], backref="received_requests")
 
+    # Pending requests (received and sent) are a small minority: index just those rows
+    __table_args__ = (
+        Index('ix_friendships_friend_id_pending', 'friend_id',
+              postgresql_where=(status == FriendshipStatusEnum.PENDING),
+              sqlite_where=(status == FriendshipStatusEnum.PENDING)),
+        Index('ix_friendships_user_id_pending', 'user_id',
+              postgresql_where=(status == FriendshipStatusEnum.PENDING),
+              sqlite_where=(status == FriendshipStatusEnum.PENDING)),
+    )
+
     def __repr__(self):
         return f"<Friendship(user_id={self.user_id}, friend_id={self.friend_id}, status={self.status})>"
 
@@ -333,7 +383,7 @@ class Friendship(Base):
             "id": self.id,
             "user_id": self.user_id,
             "friend_id": self.friend_id,
-            "status": self.status.value,
+            "status": self.status.name.lower(),
             "created_at": self.created_at.isoformat() if self.created_at else None
         }
         if include_user and self.requester:
@@ -381,6 +431,17 @@ class Challenge(Base):
     opponent = relationship("User", foreign_keys=[opponent_id], backref="received_challenges")
     winner = relationship("User", foreign_keys=[winner_id])
 
+    # Invites and running challenges are a small minority next to finished ones:
+    # index just those rows, per side
+    __table_args__ = (
+        Index('ix_challenges_opponent_id_open', 'opponent_id',
+              postgresql_where=status.in_([ChallengeStatusEnum.PENDING, ChallengeStatusEnum.ACTIVE]),
+              sqlite_where=status.in_([ChallengeStatusEnum.PENDING, ChallengeStatusEnum.ACTIVE])),
+        Index('ix_challenges_creator_id_open', 'creator_id',
+              postgresql_where=status.in_([ChallengeStatusEnum.PENDING, ChallengeStatusEnum.ACTIVE]),
+              sqlite_where=status.in_([ChallengeStatusEnum.PENDING, ChallengeStatusEnum.ACTIVE])),
+    )
+
     def __repr__(self):
         return f"<Challenge(id={self.id}, title='{self.title}', status={self.status})>"
 
@@ -471,6 +532,15 @@ class SeasonScore(Base):
         return data
 
 
+# Connection pool sizing for server databases (SQLite uses its own single-file pool)
+POOL_OPTIONS = {
+    "pool_size": 20,
+    "max_overflow": 10,
+    "pool_pre_ping": True,   # Drop connections the server closed while idle
+    "pool_recycle": 1800,    # Recycle before typical server-side idle timeouts
+}
+
+
 def init_db(database_url: str):
     """
     Initialize the database connection and create tables.
@@ -479,11 +549,14 @@ def init_db(database_url: str):
         database_url: PostgreSQL connection string
         
     Returns:
-        tuple: (engine, Session class)
+        tuple: (engine, scoped Session registry - one session per thread/request)
     """
-    engine = create_engine(database_url, echo=False)
+    pool_options = {} if make_url(database_url).get_backend_name() == 'sqlite' else POOL_OPTIONS
+    engine = create_engine(database_url, echo=False, **pool_options)
     Base.metadata.create_all(engine)
-    Session = sessionmaker(bind=engine)
+    # expire_on_commit=False: handlers serialize the rows they just committed (e.g. the
+    # profile PUT returning user.to_dict()) without a reload SELECT per instance
+    Session = scoped_session(sessionmaker(bind=engine, expire_on_commit=False))
     return engine, Session
 
 
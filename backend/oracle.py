@@ -4,6 +4,7 @@ Phase 7: Prescriptive Analytics Engine
 Uses Pandas to analyze user activity history and provide actionable workflow advice.
 """
 
+import random
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
@@ -32,7 +33,7 @@ def activities_to_dataframe(activities: List[Any]) -> pd.DataFrame:
             'duration_minutes': activity.duration_minutes or 30,
             'productivity_score': activity.productivity_score or 0,
             'sentiment_score': activity.sentiment_score or 0,
-            'is_focus_session': bool(activity.is_focus_session),
+            'is_focus_session': activity.is_focus_session,
             'timestamp': activity.timestamp
         })
     
@@ -565,7 +566,6 @@ def check_proactive_intervention(activities: List[Any], tz_offset: int = 0) -> O
     
     # 1. Extended Work Session (3+ hours career without health break)
     if career_minutes >= 180 and health_minutes < 15:
-        import random
         mission = random.choice([m for m in RECOVERY_MISSIONS if m['category'] == 'Health'])
         return {
             "type": "burnout_risk",
@@ -579,7 +579,6 @@ def check_proactive_intervention(activities: List[Any], tz_offset: int = 0) -> O
     
     # 2. Late Night Work (after 10 PM local time)
     if current_hour >= 22 and career_minutes > 60:
-        import random
         mission = random.choice(RECOVERY_MISSIONS)
         return {
             "type": "late_night",
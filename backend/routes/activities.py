@@ -3,15 +3,17 @@ FocusFlow - Activities Blueprint
 Handles activity logging, CRUD operations, dashboard, and weekly recap.
 """
 
+from collections import defaultdict
 from datetime import datetime, timedelta
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, g
 
 from models import ActivityLog, CategoryEnum, User
-from utils import get_current_user
-from nlp_parser import parse_activity
-from gamification import process_activity_gamification, get_level_progress, calculate_streak
+from utils import get_current_user, request_now
+from cache import cache_endpoint, etag_endpoint, activities_version_key, dashboard_cache_prefix, invalidate_dashboard
+from nlp_parser import parse_activity, calculate_weighted_score
+from gamification import process_activity_gamification, get_level_progress, calculate_streak, get_badge_dicts
 from schemas import activity_log_schema, activity_update_schema
-from errors import handle_validation_error, api_error_response
+from errors import api_error_response
 
 
 # Create blueprint
@@ -41,7 +43,6 @@ def health_check():
 # ============================================================================
 
 @activities_bp.route('/api/log_activity', methods=['POST'])
-@handle_validation_error
 def log_activity():
     """
     Log a new activity from natural language input.
@@ -83,21 +84,16 @@ def log_activity():
             duration_minutes=parsed['duration_minutes'],
             sentiment_score=parsed['sentiment_score'],
             productivity_score=parsed['productivity_score'],
-            is_focus_session=1 if parsed.get('is_focus_session') else 0,
-            timestamp=datetime.utcnow()
+            is_focus_session=bool(parsed.get('is_focus_session')),
+            timestamp=request_now()
         )
         
         session.add(activity)
         session.flush()  # Get activity ID
         
-        # Get all user activities for badge checking
-        all_activities = session.query(ActivityLog).filter(
-            ActivityLog.user_id == user.id
-        ).all()
-        
         # Process gamification (XP + badges) - pass local_hour for timezone-aware checks
         gamification_result = process_activity_gamification(
-            session, user, activity, all_activities, local_hour
+            session, user, activity, local_hour
         )
         
         # Award chest credits for CUMULATIVE productive work (Phase 4.5)
@@ -119,6 +115,7 @@ def log_activity():
                 user.productive_minutes = remaining_minutes  # Keep remainder for next time
         
         session.commit()
+        invalidate_dashboard(user.id)
         
         return jsonify({
             "success": True,
@@ -157,7 +154,7 @@ def get_activities():
             except ValueError:
                 return jsonify({"error": "Invalid date format. Use YYYY-MM-DD"}), 400
         else:
-            target_date = datetime.utcnow().date()
+            target_date = request_now().date()
         
         # Calculate UTC range for the user's local day
         local_midnight = datetime.combine(target_date, datetime.min.time())
@@ -200,6 +197,7 @@ def delete_activity(activity_id):
         
         session.delete(activity)
         session.commit()
+        invalidate_dashboard(user.id)
         
         return jsonify({"success": True, "message": "Activity deleted"})
         
@@ -211,7 +209,6 @@ def delete_activity(activity_id):
 
 
 @activities_bp.route('/api/activities/<int:activity_id>', methods=['PUT'])
-@handle_validation_error
 def update_activity(activity_id):
     """
     Update an activity by ID.
@@ -256,14 +253,14 @@ def update_activity(activity_id):
         
         # Recalculate productivity score if category or duration changed
         if needs_score_update:
-            from nlp_parser import calculate_weighted_score
             activity.productivity_score = calculate_weighted_score(
                 category=activity.category,
                 duration_minutes=activity.duration_minutes,
-                is_focus_session=bool(activity.is_focus_session)
+                is_focus_session=activity.is_focus_session
             )
         
         session.commit()
+        invalidate_dashboard(user.id)
         
         return jsonify({
             "success": True,
@@ -281,7 +278,19 @@ def update_activity(activity_id):
 # DASHBOARD
 # ============================================================================
 
+def _dashboard_cache_key():
+    """Cache key for the dashboard: authenticated user + requested day + tz offset."""
+    user_id = getattr(g, 'user_id', None)
+    if not user_id:
+        return None  # Demo requests are not cached
+    date_str = request.args.get('date') or request_now().date().isoformat()
+    tz_offset = request.args.get('tz_offset', type=int, default=0)
+    return f"{dashboard_cache_prefix(user_id)}{date_str}:{tz_offset}"
+
+
 @activities_bp.route('/api/dashboard', methods=['GET'])
+@etag_endpoint(key=_dashboard_cache_key, version=activities_version_key)
+@cache_endpoint(key=_dashboard_cache_key)
 def get_dashboard():
     """Get dashboard statistics including gamification info."""
     date_str = request.args.get('date')
@@ -297,7 +306,7 @@ def get_dashboard():
             except ValueError:
                 return jsonify({"error": "Invalid date format. Use YYYY-MM-DD"}), 400
         else:
-            target_date = datetime.utcnow().date()
+            target_date = request_now().date()
         
         # Calculate UTC range for the user's local day
         local_midnight = datetime.combine(target_date, datetime.min.time())
@@ -310,23 +319,27 @@ def get_dashboard():
             ActivityLog.timestamp < end_of_day_utc
         ).all()
         
-        daily_score = sum(a.productivity_score for a in activities)
-        
-        category_breakdown = {}
-        for category in CategoryEnum:
-            category_activities = [a for a in activities if a.category == category]
-            total_minutes = sum(
-                a.duration_minutes or 30
-                for a in category_activities
-            )
-            if total_minutes > 0:
-                category_breakdown[category.value] = {
-                    "minutes": total_minutes,
-                    "count": len(category_activities)
-                }
-        
-        sentiments = [a.sentiment_score for a in activities if a.sentiment_score is not None]
-        avg_sentiment = round(sum(sentiments) / len(sentiments), 2) if sentiments else 0
+        # Single pass: score, per-category [minutes, count], and sentiment totals
+        daily_score = 0
+        buckets = defaultdict(lambda: [0, 0])
+        sentiment_total = 0
+        sentiment_count = 0
+        for a in activities:
+            daily_score += a.productivity_score
+            bucket = buckets[a.category]
+            bucket[0] += a.duration_minutes or 30
+            bucket[1] += 1
+            if a.sentiment_score is not None:
+                sentiment_total += a.sentiment_score
+                sentiment_count += 1
+        
+        category_breakdown = {
+            category.value: {"minutes": buckets[category][0], "count": buckets[category][1]}
+            for category in CategoryEnum
+            if buckets[category][0] > 0
+        }
+        
+        avg_sentiment = round(sentiment_total / sentiment_count, 2) if sentiment_count else 0
         
         # Get level progress
         level_info = get_level_progress(user.xp)
@@ -364,7 +377,7 @@ def get_weekly_recap():
         user = get_current_user(session)
         
         # Calculate last week's date range
-        today = datetime.utcnow().date()
+        today = request_now().date()
         # Get Monday of this week
         this_monday = today - timedelta(days=today.weekday())
         # Last week = Monday to Sunday before this week
@@ -395,10 +408,21 @@ def get_weekly_recap():
             ActivityLog.timestamp <= prev_end_datetime
         ).all()
         
-        # Calculate stats
+        # Single pass: totals, per-category [minutes, count], and per-day scores
         total_activities = len(activities)
-        total_score = sum(a.productivity_score for a in activities)
-        total_minutes = sum(a.duration_minutes or 30 for a in activities)
+        total_score = 0
+        total_minutes = 0
+        buckets = defaultdict(lambda: [0, 0])
+        daily_scores = {}
+        for a in activities:
+            minutes = a.duration_minutes or 30
+            total_score += a.productivity_score
+            total_minutes += minutes
+            bucket = buckets[a.category]
+            bucket[0] += minutes
+            bucket[1] += 1
+            day = a.timestamp.date().isoformat()
+            daily_scores[day] = daily_scores.get(day, 0) + a.productivity_score
         total_hours = round(total_minutes / 60, 1)
         
         prev_total_score = sum(a.productivity_score for a in prev_activities)
@@ -410,22 +434,13 @@ def get_weekly_recap():
             trend_vs_previous = 100 if total_score > 0 else 0
         
         # Category breakdown
-        category_breakdown = {}
-        for category in CategoryEnum:
-            category_activities = [a for a in activities if a.category == category]
-            cat_minutes = sum(a.duration_minutes or 30 for a in category_activities)
-            if cat_minutes > 0:
-                category_breakdown[category.value] = {
-                    "minutes": cat_minutes,
-                    "count": len(category_activities)
-                }
+        category_breakdown = {
+            category.value: {"minutes": buckets[category][0], "count": buckets[category][1]}
+            for category in CategoryEnum
+            if buckets[category][0] > 0
+        }
         
         # Find top day
-        daily_scores = {}
-        for activity in activities:
-            day = activity.timestamp.date().isoformat()
-            daily_scores[day] = daily_scores.get(day, 0) + activity.productivity_score
-        
         top_day = None
         if daily_scores:
             best_day = max(daily_scores.items(), key=lambda x: x[1])
@@ -435,10 +450,12 @@ def get_weekly_recap():
         streak_info = calculate_streak(session, user.id)
         
         # Get badges earned during the week
-        badges_earned = []
-        for ub in user.badges:
-            if ub.earned_at and start_datetime <= ub.earned_at <= end_datetime:
-                badges_earned.append(ub.badge.to_dict())
+        week_badge_ids = [
+            ub.badge_id for ub in user.badges
+            if ub.earned_at and start_datetime <= ub.earned_at <= end_datetime
+        ]
+        badge_dicts = get_badge_dicts(session, week_badge_ids)
+        badges_earned = [badge_dicts[badge_id] for badge_id in week_badge_ids]
         
         return jsonify({
             "week_start": last_week_start.isoformat(),
@@ -156,9 +156,13 @@ def get_work_modes_analysis():
     try:
         user = get_current_user(session)
         
-        activities = session.query(ActivityLog).filter(
+        # Stream just the columns the clustering reads, 1000 rows at a time
+        activities = session.query(
+            ActivityLog.activity_name, ActivityLog.raw_input, ActivityLog.category,
+            ActivityLog.duration_minutes, ActivityLog.productivity_score
+        ).filter(
             ActivityLog.user_id == user.id
-        ).all()
+        ).yield_per(1000)
         
         result = analyze_work_modes(activities)
         return jsonify(result)
@@ -156,7 +156,7 @@ def accept_challenge(challenge_id):
     try:
         user = get_current_user(session)
         
-        challenge = session.query(Challenge).get(challenge_id)
+        challenge = session.get(Challenge, challenge_id)
         
         if not challenge:
             return jsonify({"error": "Challenge not found"}), 404
@@ -199,7 +199,7 @@ def decline_challenge(challenge_id):
     try:
         user = get_current_user(session)
         
-        challenge = session.query(Challenge).get(challenge_id)
+        challenge = session.get(Challenge, challenge_id)
         
         if not challenge:
             return jsonify({"error": "Challenge not found"}), 404
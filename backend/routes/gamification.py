@@ -5,10 +5,12 @@ Handles skill trees, loot system, collection, and projections.
 
 from datetime import datetime, timedelta
 from flask import Blueprint, request, jsonify
+from sqlalchemy import select
 
-from models import ActivityLog, CategoryEnum, Item, UserItem
-from utils import get_current_user
-from gamification import check_chest_eligibility, open_chest, repair_item
+from models import ActivityLog, CategoryEnum, UserItem
+from utils import get_current_user, request_now
+from gamification import check_chest_eligibility, open_chest, open_chests, repair_item, get_item_dicts
+from skill_trees import get_skill_tree_progress, get_active_perks
 
 
 # Create blueprint
@@ -34,7 +36,6 @@ def get_skill_trees():
     try:
         user = get_current_user(session)
         
-        from skill_trees import get_skill_tree_progress
         progress = get_skill_tree_progress(session, user.id)
         
         return jsonify({"skill_trees": progress})
@@ -52,7 +53,6 @@ def get_unlocked_perks():
     try:
         user = get_current_user(session)
         
-        from skill_trees import get_active_perks
         perks = get_active_perks(session, user.id)
         
         return jsonify({"perks": perks})
@@ -95,7 +95,36 @@ def open_loot_chest():
             status_code = 400 if result.get('credits_required') else 500
             return jsonify(result), status_code
         
-        session.commit()
+        return jsonify({
+            "success": True,
+            "credits_remaining": user.chest_credits or 0,
+            **result
+        }), 200
+        
+    except Exception as e:
+        session.rollback()
+        return jsonify({"error": str(e)}), 500
+    finally:
+        session.close()
+
+
+@gamification_bp.route('/api/user/open_chests', methods=['POST'])
+def open_loot_chests():
+    """Open several loot chests at once, using 1 credit each."""
+    session = Session()
+    try:
+        user = get_current_user(session)
+        
+        data = request.get_json(silent=True) or {}
+        count = data.get('count', 1)
+        if not isinstance(count, int) or isinstance(count, bool) or count < 1:
+            return jsonify({"error": "count must be a positive integer"}), 400
+        
+        result = open_chests(session, user, count)
+        
+        if 'error' in result:
+            status_code = 400 if result.get('credits_required') else 500
+            return jsonify(result), status_code
         
         return jsonify({
             "success": True,
@@ -117,33 +146,50 @@ def get_user_collection():
     try:
         user = get_current_user(session)
         
-        user_items = session.query(UserItem).filter(
-            UserItem.user_id == user.id
+        # Catalogue dicts are cached per process (items are seed data)
+        item_dicts = get_item_dicts(session)
+        user_items = session.execute(
+            select(
+                UserItem.id, UserItem.item_id, UserItem.count,
+                UserItem.is_broken, UserItem.first_obtained_at
+            ).where(UserItem.user_id == user.id)
         ).all()
         
-        all_items = session.query(Item).all()
-        all_items_dict = {item.id: item.to_dict() for item in all_items}
-        
-        owned_ids = {ui.item_id for ui in user_items}
-        owned_items = [ui.to_dict() for ui in user_items]
-        
-        broken_count = sum(1 for ui in user_items if ui.is_broken)
+        # Single pass over the user's items (same shape as UserItem.to_dict)
+        owned_by_item_id = {}
+        owned_items = []
+        broken_count = 0
+        for ui in user_items:
+            owned_by_item_id[ui.item_id] = ui
+            owned_items.append({
+                "id": ui.id,
+                "user_id": user.id,
+                "item_id": ui.item_id,
+                "item": item_dicts.get(ui.item_id),
+                "count": ui.count,
+                "is_broken": ui.is_broken,
+                "first_obtained_at": ui.first_obtained_at.isoformat() if ui.first_obtained_at else None
+            })
+            if ui.is_broken:
+                broken_count += 1
+        
+        all_items_data = []
+        for item_id, item_dict in item_dicts.items():
+            owned = owned_by_item_id.get(item_id)
+            all_items_data.append({
+                **item_dict,
+                "owned": owned is not None,
+                "count": owned.count if owned else 0,
+                "is_broken": owned.is_broken if owned else False
+            })
         
         return jsonify({
             "owned_items": owned_items,
             "owned_count": len(owned_items),
             "broken_count": broken_count,
-            "total_items": len(all_items),
+            "total_items": len(item_dicts),
             "chest_credits": user.chest_credits,
-            "all_items": [
-                {
-                    **item.to_dict(),
-                    "owned": item.id in owned_ids,
-                    "count": next((ui.count for ui in user_items if ui.item_id == item.id), 0),
-                    "is_broken": next((ui.is_broken for ui in user_items if ui.item_id == item.id), False)
-                }
-                for item in all_items
-            ]
+            "all_items": all_items_data
         })
         
     except Exception as e:
@@ -182,7 +228,8 @@ def get_time_projection():
     try:
         user = get_current_user(session)
         
-        current_year = datetime.utcnow().year
+        now = request_now()
+        current_year = now.year
         if user.birth_year:
             age = current_year - user.birth_year
         else:
@@ -190,7 +237,7 @@ def get_time_projection():
         
         remaining_years = max(0, 80 - age)
         
-        seven_days_ago = datetime.utcnow() - timedelta(days=7)
+        seven_days_ago = now - timedelta(days=7)
         
         leisure_activities = session.query(ActivityLog).filter(
             ActivityLog.user_id == user.id,
@@ -208,7 +255,7 @@ def get_time_projection():
         
         percent_of_life = (avg_daily_leisure_hours / 24) * 100
         
-        today = datetime.utcnow().date()
+        today = now.date()
         start_of_today = datetime.combine(today, datetime.min.time())
         
         todays_leisure = session.query(ActivityLog).filter(
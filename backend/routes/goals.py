@@ -8,8 +8,9 @@ from flask import Blueprint, request, jsonify
 
 from models import Goal, ActivityLog, CategoryEnum, TimeframeEnum, GoalTypeEnum
 from utils import get_current_user
+from gamification import goal_match_title
 from schemas import goal_schema
-from errors import handle_validation_error, api_error_response
+from errors import api_error_response
 
 
 # Create blueprint
@@ -70,11 +71,7 @@ def get_goals():
             
             # Get activities for this goal
             if goal.title:
-                title_lower = goal.title.lower()
-                for prefix in ['limit ', 'reduce ', 'avoid ', 'stop ', 'less ', 'target ', 'achieve ']:
-                    if title_lower.startswith(prefix):
-                        title_lower = title_lower[len(prefix):]
-                        break
+                title_lower = goal_match_title(goal.title)
                 
                 all_category_activities = session.query(ActivityLog).filter(
                     ActivityLog.user_id == user.id,
@@ -158,7 +155,6 @@ def get_goals():
 
 
 @goals_bp.route('/api/goals', methods=['POST'])
-@handle_validation_error
 def create_goal():
     """Create a new goal with optional custom title and goal type."""
     data = request.get_json()
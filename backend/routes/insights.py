@@ -3,11 +3,13 @@ FocusFlow - Insights Blueprint
 Handles AI insights, Oracle, heatmap data, and morning check-in.
 """
 
+import traceback
 from datetime import datetime, timedelta
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, g
 
 from models import ActivityLog
-from utils import get_current_user, build_insight_context
+from utils import get_current_user, build_insight_context, request_now
+from cache import etag_endpoint, activities_version_key
 from nlp_parser import generate_daily_insights
 from oracle import get_oracle_insight, get_all_oracle_insights, check_proactive_intervention
 
@@ -121,7 +123,6 @@ def get_oracle():
         return jsonify(result)
         
     except Exception as e:
-        import traceback
         traceback.print_exc()
         return jsonify({"error": str(e)}), 500
     finally:
@@ -159,7 +160,17 @@ def get_proactive_intervention():
 # HEATMAP
 # ============================================================================
 
+def _heatmap_etag_key():
+    """ETag key for the heatmap: authenticated user + today's date + tz offset."""
+    user_id = getattr(g, 'user_id', None)
+    if not user_id:
+        return None  # Demo requests get no ETag
+    tz_offset = request.args.get('tz_offset', type=int, default=0)
+    return f"heatmap:{user_id}:{request_now().date().isoformat()}:{tz_offset}"
+
+
 @insights_bp.route('/api/activities/heatmap', methods=['GET'])
+@etag_endpoint(key=_heatmap_etag_key, version=activities_version_key)
 def get_heatmap_data():
     """Get activity data for heatmap visualization."""
     tz_offset = request.args.get('tz_offset', type=int, default=0)  # Minutes offset from UTC
@@ -168,7 +179,7 @@ def get_heatmap_data():
     try:
         user = get_current_user(session)
         
-        end_date = datetime.utcnow().date()
+        end_date = request_now().date()
         start_date = end_date - timedelta(days=365)
         
         start_datetime = datetime.combine(start_date, datetime.min.time())
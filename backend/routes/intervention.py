@@ -0,0 +1,170 @@
+"""
+FocusFlow - Intervention Blueprint
+Handles the desktop watcher's gaming heartbeat and intervention status polling.
+"""
+
+from datetime import datetime
+from flask import Blueprint, request, jsonify
+from sqlalchemy import update, case, or_, func
+
+from models import User
+from utils import get_current_user
+from cache import redis_client
+
+
+# Create blueprint
+intervention_bp = Blueprint('intervention', __name__)
+
+# Session factory will be set by app.py
+Session = None
+
+def init_intervention_routes(session_factory):
+    """Initialize the blueprint with the database session factory."""
+    global Session
+    Session = session_factory
+
+
+# ============================================================================
+# INTERVENTION / WATCHER SYSTEM (Phase 4)
+# ============================================================================
+
+# Redis gaming counters (when REDIS_URL is set): one key per user per UTC day
+GAMING_COUNTER_TTL_SECONDS = 172800  # 2 days
+GAMING_FLUSH_EVERY_MINUTES = 5  # Persist the Redis counter to users.today_gaming_minutes this often
+
+# Status thresholds and messages (heartbeats arrive every minute per user)
+DEFAULT_GAMING_ALLOWANCE = 60
+GAMING_WARNING_MINUTES = 10
+CRITICAL_MESSAGE = "⛔ LIMIT EXCEEDED! Time to stop!"
+WARNING_TEMPLATE = "⚠️ Only %d minutes remaining!"
+OK_TEMPLATE = "✓ %d minutes remaining"
+
+
+def _gaming_counter_key(user_id, day):
+    return f"gm:{user_id}:{day:%Y%m%d}"
+
+
+def _increment_gaming_minutes_sql(session, user_id, now):
+    """Daily reset + increment in one atomic UPDATE; returns (minutes used, allowance)."""
+    start_of_today = datetime.combine(now.date(), datetime.min.time())
+    needs_reset = or_(User.last_gaming_reset.is_(None), User.last_gaming_reset < start_of_today)
+    minutes_used, allowance = session.execute(
+        update(User)
+        .where(User.id == user_id)
+        .values(
+            today_gaming_minutes=case(
+                (needs_reset, 1),
+                else_=func.coalesce(User.today_gaming_minutes, 0) + 1
+            ),
+            last_gaming_reset=case((needs_reset, now), else_=User.last_gaming_reset)
+        )
+        .returning(User.today_gaming_minutes, User.daily_gaming_allowance)
+        .execution_options(synchronize_session=False)
+    ).one()
+    session.commit()
+    return minutes_used, allowance
+
+
+def _gaming_status(remaining):
+    """Map minutes remaining in the daily allowance to OK / WARNING / CRITICAL."""
+    if remaining <= 0:
+        return 'CRITICAL'
+    elif remaining <= GAMING_WARNING_MINUTES:
+        return 'WARNING'
+    return 'OK'
+
+
+def _gaming_message(status, remaining):
+    """User-facing message for a heartbeat status."""
+    if status == 'CRITICAL':
+        return CRITICAL_MESSAGE
+    return (WARNING_TEMPLATE if status == 'WARNING' else OK_TEMPLATE) % remaining
+
+
+@intervention_bp.route('/api/intervention/heartbeat', methods=['POST'])
+def intervention_heartbeat():
+    """
+    Receive heartbeat from Watcher script when gaming app is detected.
+    Increments today_gaming_minutes and returns status.
+    """
+    data = request.get_json()
+    app_detected = data.get('app_detected', 'Unknown') if data else 'Unknown'
+    
+    session = Session()
+    try:
+        user = get_current_user(session)
+        
+        now = datetime.utcnow()
+        if redis_client is not None:
+            # Count in Redis; only write through to Postgres on the first minute of the day,
+            # every few minutes, and when the allowance is reached
+            key = _gaming_counter_key(user.id, now.date())
+            # INCR and EXPIRE in one MULTI/EXEC round trip, so the key can't be left without a TTL
+            pipe = redis_client.pipeline()
+            pipe.incr(key)
+            pipe.expire(key, GAMING_COUNTER_TTL_SECONDS)
+            minutes_used, _ = pipe.execute()
+            allowance = user.daily_gaming_allowance or DEFAULT_GAMING_ALLOWANCE
+            if (minutes_used == 1 or minutes_used % GAMING_FLUSH_EVERY_MINUTES == 0
+                    or minutes_used == allowance):
+                user.today_gaming_minutes = minutes_used
+                user.last_gaming_reset = now
+                session.commit()
+        else:
+            # Atomic UPDATE, so concurrent heartbeats can't lose minutes
+            minutes_used, allowance = _increment_gaming_minutes_sql(session, user.id, now)
+        
+        # Calculate remaining time
+        allowance = allowance or DEFAULT_GAMING_ALLOWANCE
+        remaining = allowance - minutes_used
+        status = _gaming_status(remaining)
+        message = _gaming_message(status, remaining)
+        
+        return jsonify({
+            "status": status,
+            "message": message,
+            "app_detected": app_detected,
+            "gaming_minutes": minutes_used,
+            "allowance": allowance,
+            "remaining": remaining if remaining > 0 else 0
+        })
+        
+    except Exception as e:
+        session.rollback()
+        return jsonify({"error": str(e)}), 500
+    finally:
+        session.close()
+
+
+@intervention_bp.route('/api/user/intervention_status', methods=['GET'])
+def get_intervention_status():
+    """Get current intervention/gaming status for polling (read-only)."""
+    session = Session()
+    try:
+        user = get_current_user(session)
+        
+        # Redis holds the live counter when configured. Otherwise a reset from a previous
+        # day means 0 minutes used today; the next heartbeat persists it
+        today = datetime.utcnow().date()
+        if redis_client is not None:
+            minutes_used = int(redis_client.get(_gaming_counter_key(user.id, today)) or 0)
+        elif user.last_gaming_reset is None or user.last_gaming_reset.date() < today:
+            minutes_used = 0
+        else:
+            minutes_used = user.today_gaming_minutes or 0
+        
+        allowance = user.daily_gaming_allowance or DEFAULT_GAMING_ALLOWANCE
+        remaining = allowance - minutes_used
+        status = _gaming_status(remaining)
+        
+        return jsonify({
+            "status": status,
+            "gaming_minutes": minutes_used,
+            "allowance": allowance,
+            "remaining": remaining if remaining > 0 else 0
+        })
+        
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    finally:
+        session.close()
@@ -3,15 +3,13 @@ FocusFlow - Profile Blueprint
 Handles user profile CRUD, public profiles, and data export.
 """
 
-import csv
-import io
 from datetime import datetime
-from flask import Blueprint, request, jsonify, Response
-from sqlalchemy import func
+from flask import Blueprint, request, jsonify, Response, stream_with_context
+from sqlalchemy import func, select
 
 from models import ActivityLog, UserBadge, Badge, User, Friendship, FriendshipStatusEnum
-from utils import get_current_user
-from gamification import get_level_progress
+from utils import get_current_user, stream_json_array, stream_csv
+from gamification import get_level_progress, get_badge_dicts
 
 
 # Create blueprint
@@ -30,6 +28,36 @@ def init_profile_routes(session_factory):
 # USER PROFILE
 # ============================================================================
 
+def _activity_totals(session, user_id):
+    """(activity count, summed productivity score) in a single aggregate query."""
+    total_activities, total_score = session.query(
+        func.count(ActivityLog.id),
+        func.coalesce(func.sum(ActivityLog.productivity_score), 0)
+    ).filter(ActivityLog.user_id == user_id).one()
+    return total_activities, total_score
+
+
+def _badges_for_user(session, user_id):
+    """
+    Serialized badges (same shape as UserBadge.to_dict), reading only UserBadge columns;
+    the Badge part comes from the per-process badge dict cache.
+    """
+    rows = session.query(
+        UserBadge.id, UserBadge.badge_id, UserBadge.earned_at
+    ).filter(UserBadge.user_id == user_id).all()
+    badge_dicts = get_badge_dicts(session, [row.badge_id for row in rows])
+    return [
+        {
+            "id": row.id,
+            "user_id": user_id,
+            "badge_id": row.badge_id,
+            "badge": badge_dicts.get(row.badge_id),
+            "earned_at": row.earned_at.isoformat() if row.earned_at else None
+        }
+        for row in rows
+    ]
+
+
 @profile_bp.route('/api/user/profile', methods=['GET'])
 def get_profile():
     """Get current user's full profile including badges."""
@@ -37,21 +65,11 @@ def get_profile():
     try:
         user = get_current_user(session)
         
-        user_badges = session.query(UserBadge).filter(
-            UserBadge.user_id == user.id
-        ).all()
-        
-        badges = [ub.to_dict() for ub in user_badges]
+        badges = _badges_for_user(session, user.id)
         
         level_info = get_level_progress(user.xp)
         
-        total_activities = session.query(ActivityLog).filter(
-            ActivityLog.user_id == user.id
-        ).count()
-        
-        total_score = session.query(func.sum(ActivityLog.productivity_score)).filter(
-            ActivityLog.user_id == user.id
-        ).scalar() or 0
+        total_activities, total_score = _activity_totals(session, user.id)
         
         return jsonify({
             "user": user.to_dict(include_private=True),
@@ -158,18 +176,9 @@ def get_user_public_profile(user_id):
         
         level_info = get_level_progress(target_user.xp)
         
-        total_activities = session.query(ActivityLog).filter(
-            ActivityLog.user_id == user_id
-        ).count()
+        total_activities, total_score = _activity_totals(session, user_id)
         
-        total_score = session.query(func.sum(ActivityLog.productivity_score)).filter(
-            ActivityLog.user_id == user_id
-        ).scalar() or 0
-        
-        user_badges = session.query(UserBadge).filter(
-            UserBadge.user_id == user_id
-        ).all()
-        badges = [ub.to_dict() for ub in user_badges]
+        badges = _badges_for_user(session, user_id)
         
         return jsonify({
             "user": {
@@ -203,47 +212,68 @@ def get_user_public_profile(user_id):
 # DATA EXPORT
 # ============================================================================
 
+EXPORT_CSV_HEADER = [
+    'Timestamp', 'Activity', 'Category', 'Duration (min)',
+    'Productivity Score', 'Focus Session', 'Raw Input'
+]
+
+
+# Only the columns the CSV needs, read as Core rows rather than ActivityLog objects
+EXPORT_CSV_COLUMNS = (
+    ActivityLog.timestamp, ActivityLog.activity_name, ActivityLog.category,
+    ActivityLog.duration_minutes, ActivityLog.productivity_score,
+    ActivityLog.is_focus_session, ActivityLog.raw_input
+)
+
+
+def _export_csv_row(activity):
+    """One CSV line of the activity export (a Row of EXPORT_CSV_COLUMNS)."""
+    return [
+        activity.timestamp.isoformat() if activity.timestamp else '',
+        activity.activity_name,
+        activity.category.value if activity.category else '',
+        activity.duration_minutes or '',
+        round(activity.productivity_score, 2) if activity.productivity_score else '',
+        'Yes' if activity.is_focus_session else 'No',
+        activity.raw_input
+    ]
+
 @profile_bp.route('/api/user/export_data', methods=['GET'])
 def export_data():
-    """Export all user activity data as CSV."""
+    """
+    Export all user activity data as CSV, streamed row by row.
+    Pass ?format=json to stream the activities as a JSON array instead.
+    """
+    export_format = request.args.get('format', 'csv').lower()
+    
     session = Session()
     try:
         user = get_current_user(session)
         
-        activities = session.query(ActivityLog).filter(
+        # The streams outlive this request's scoped session: they open plain sessions
+        if export_format == 'json':
+            stmt = select(ActivityLog).where(
+                ActivityLog.user_id == user.id
+            ).order_by(ActivityLog.timestamp.desc())
+            return Response(
+                stream_with_context(stream_json_array(Session.session_factory, stmt, ActivityLog.to_dict)),
+                mimetype='application/json',
+                headers={
+                    'Content-Disposition': f'attachment; filename=focusflow_export_{datetime.utcnow().strftime("%Y%m%d")}.json'
+                }
+            )
+        
+        stmt = select(*EXPORT_CSV_COLUMNS).where(
             ActivityLog.user_id == user.id
-        ).order_by(ActivityLog.timestamp.desc()).all()
-        
-        output = io.StringIO()
-        writer = csv.writer(output)
-        
-        writer.writerow([
-            'Timestamp', 'Activity', 'Category', 'Duration (min)',
-            'Productivity Score', 'Focus Session', 'Raw Input'
-        ])
-        
-        for activity in activities:
-            writer.writerow([
-                activity.timestamp.isoformat() if activity.timestamp else '',
-                activity.activity_name,
-                activity.category.value if activity.category else '',
-                activity.duration_minutes or '',
-                round(activity.productivity_score, 2) if activity.productivity_score else '',
-                'Yes' if activity.is_focus_session else 'No',
-                activity.raw_input
-            ])
-        
-        output.seek(0)
-        response = Response(
-            output.getvalue(),
+        ).order_by(ActivityLog.timestamp.desc())
+        return Response(
+            stream_with_context(stream_csv(Session.session_factory, stmt, EXPORT_CSV_HEADER, _export_csv_row)),
             mimetype='text/csv',
             headers={
                 'Content-Disposition': f'attachment; filename=focusflow_export_{datetime.utcnow().strftime("%Y%m%d")}.csv'
             }
         )
         
-        return response
-        
     except Exception as e:
         return jsonify({"error": str(e)}), 500
     finally:
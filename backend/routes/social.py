@@ -4,18 +4,58 @@ Handles friends, leaderboard, seasons, and notifications.
 """
 
 from datetime import datetime, timedelta
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, g
+from sqlalchemy import func, and_, desc
 
-from models import User, ActivityLog, Friendship, FriendshipStatusEnum, Season
-from utils import get_current_user
+from models import User, ActivityLog, Friendship, FriendshipStatusEnum, Season, Challenge, ChallengeStatusEnum
+from utils import get_current_user, get_week_start
+from cache import redis_client, cache_endpoint, etag_endpoint, friends_cache_key, friends_version_key, invalidate_friends
 
-# Optional: simple TTL cache for get_leaderboard (index on ActivityLog.category is priority)
+# Short TTL cache for get_leaderboard: a Redis sorted set per (week, tz offset)
+# when REDIS_URL is set, otherwise an in-process dict
 _leaderboard_cache = {}
 _LEADERBOARD_CACHE_TTL_SECONDS = 60
+LEADERBOARD_SIZE = 10
+_USER_META_FIELDS = ('name', 'level', 'avatar_color')
+
+# Matches the width of User.email / User.name
+FRIEND_IDENTIFIER_MAX_LENGTH = 255
+
+
+def _leaderboard_redis_key(cache_key):
+    week_start, tz_offset = cache_key
+    return f"lb:{week_start}:{tz_offset}"
 
 
 def _get_cached_leaderboard(cache_key):
     """Return cached result if still valid."""
+    if redis_client is not None:
+        top = redis_client.zrevrange(_leaderboard_redis_key(cache_key), 0, LEADERBOARD_SIZE - 1, withscores=True)
+        if not top:
+            return None
+        # Redis breaks score ties by member bytes; the SQL query breaks them by User.id
+        top.sort(key=lambda entry: (-entry[1], int(entry[0])))
+        pipe = redis_client.pipeline()
+        for member, _ in top:
+            pipe.hmget(f"user:meta:{int(member)}", *_USER_META_FIELDS)
+        metas = pipe.execute()
+        if any(meta[0] is None for meta in metas):
+            return None  # Metadata expired before the ranking; rebuild both
+        return {
+            "week_start": cache_key[0],
+            "leaderboard": [
+                {
+                    "user_id": int(member),
+                    "name": name.decode(),
+                    "level": int(level) if level is not None else None,
+                    "avatar_color": avatar_color.decode() if avatar_color is not None else "#6366f1",
+                    "weekly_score": round(score, 2),
+                    "rank": i + 1
+                }
+                for i, ((member, score), (name, level, avatar_color)) in enumerate(zip(top, metas))
+            ]
+        }
+
     now = datetime.utcnow()
     if cache_key in _leaderboard_cache:
         cached_at, result = _leaderboard_cache[cache_key]
@@ -26,6 +66,21 @@ def _get_cached_leaderboard(cache_key):
 
 def _set_leaderboard_cache(cache_key, result):
     """Store result in cache."""
+    if redis_client is not None:
+        key = _leaderboard_redis_key(cache_key)
+        pipe = redis_client.pipeline()
+        pipe.delete(key)
+        for entry in result["leaderboard"]:
+            pipe.zadd(key, {entry["user_id"]: entry["weekly_score"]})
+            meta_key = f"user:meta:{entry['user_id']}"
+            # redis-py rejects None values: missing fields read back as None
+            pipe.hset(meta_key, mapping={
+                field: entry[field] for field in _USER_META_FIELDS if entry[field] is not None
+            })
+            pipe.expire(meta_key, _LEADERBOARD_CACHE_TTL_SECONDS)
+        pipe.expire(key, _LEADERBOARD_CACHE_TTL_SECONDS)
+        pipe.execute()
+        return
     _leaderboard_cache[cache_key] = (datetime.utcnow(), result)
 
 
@@ -49,10 +104,7 @@ def init_social_routes(session_factory):
 def get_leaderboard():
     """Get top 10 public users by weekly score. Cached briefly for performance."""
     tz_offset = request.args.get('tz_offset', type=int, default=0)
-    now_utc = datetime.utcnow()
-    user_local_datetime = now_utc - timedelta(minutes=tz_offset)
-    today = user_local_datetime.date()
-    start_of_week = today - timedelta(days=today.weekday())
+    start_of_week, start_datetime_utc = get_week_start(tz_offset)
     cache_key = (start_of_week.isoformat(), tz_offset)
     cached = _get_cached_leaderboard(cache_key)
     if cached is not None:
@@ -60,36 +112,32 @@ def get_leaderboard():
 
     session = Session()
     try:
-        start_datetime_local = datetime.combine(start_of_week, datetime.min.time())
-        start_datetime_utc = start_datetime_local + timedelta(minutes=tz_offset)
-        
-        public_users = session.query(User).filter(User.is_public == True).all()
-        
-        leaderboard = []
-        for user in public_users:
-            activities = session.query(ActivityLog).filter(
-                ActivityLog.user_id == user.id,
-                ActivityLog.timestamp >= start_datetime_utc
-            ).all()
-            
-            weekly_score = sum(a.productivity_score for a in activities)
-            
-            leaderboard.append({
-                "user_id": user.id,
-                "name": user.name,
-                "level": user.level,
-                "avatar_color": user.avatar_color or "#6366f1",
-                "weekly_score": round(weekly_score, 2)
-            })
-        
-        leaderboard.sort(key=lambda x: x["weekly_score"], reverse=True)
-        
-        for i, entry in enumerate(leaderboard[:10]):
-            entry["rank"] = i + 1
+        # One GROUP BY over (user_id, timestamp) instead of a query per public user
+        weekly_score = func.coalesce(func.sum(ActivityLog.productivity_score), 0).label('weekly_score')
+        rows = session.query(
+            User.id, User.name, User.level, User.avatar_color, weekly_score
+        ).outerjoin(
+            ActivityLog,
+            and_(ActivityLog.user_id == User.id, ActivityLog.timestamp >= start_datetime_utc)
+        ).filter(
+            User.is_public == True
+        ).group_by(User.id).order_by(desc('weekly_score'), User.id).limit(LEADERBOARD_SIZE).all()
+        
+        leaderboard = [
+            {
+                "user_id": row.id,
+                "name": row.name,
+                "level": row.level,
+                "avatar_color": row.avatar_color or "#6366f1",
+                "weekly_score": round(row.weekly_score, 2),
+                "rank": i + 1
+            }
+            for i, row in enumerate(rows)
+        ]
         
         result = {
             "week_start": start_of_week.isoformat(),
-            "leaderboard": leaderboard[:10]
+            "leaderboard": leaderboard
         }
         _set_leaderboard_cache(cache_key, result)
         return jsonify(result)
@@ -148,31 +196,36 @@ def get_season_leaderboard():
                 "message": "No active season"
             })
         
-        public_users = session.query(User).filter(User.is_public == True).all()
-        
-        leaderboard = []
-        for u in public_users:
-            activities = session.query(ActivityLog).filter(
-                ActivityLog.user_id == u.id,
+        # One GROUP BY over the season's (timestamp, user_id) range instead of a query
+        # per public user; the database returns the rows already ranked
+        season_score = func.coalesce(func.sum(ActivityLog.productivity_score), 0).label('season_score')
+        activities_count = func.count(ActivityLog.id).label('activities_count')
+        rows = session.query(
+            User.id, User.name, User.level, User.avatar_color, season_score, activities_count
+        ).outerjoin(
+            ActivityLog,
+            and_(
+                ActivityLog.user_id == User.id,
                 ActivityLog.timestamp >= season.start_date,
                 ActivityLog.timestamp <= season.end_date
-            ).all()
-            
-            season_score = sum(a.productivity_score for a in activities)
-            
-            leaderboard.append({
-                "user_id": u.id,
-                "name": u.name,
-                "level": u.level,
-                "avatar_color": u.avatar_color or "#6366f1",
-                "score": round(season_score, 2),
-                "activities_count": len(activities),
-                "is_you": u.id == user.id
-            })
-        
-        leaderboard.sort(key=lambda x: x["score"], reverse=True)
-        for i, entry in enumerate(leaderboard):
-            entry["rank"] = i + 1
+            )
+        ).filter(
+            User.is_public == True
+        ).group_by(User.id).order_by(desc('season_score'), User.id).all()
+        
+        leaderboard = [
+            {
+                "user_id": row.id,
+                "name": row.name,
+                "level": row.level,
+                "avatar_color": row.avatar_color or "#6366f1",
+                "score": round(row.season_score, 2),
+                "activities_count": row.activities_count,
+                "is_you": row.id == user.id,
+                "rank": i + 1
+            }
+            for i, row in enumerate(rows)
+        ]
         
         user_rank = next((e["rank"] for e in leaderboard if e["is_you"]), None)
         
@@ -196,8 +249,6 @@ def get_season_leaderboard():
 @social_bp.route('/api/notifications/count', methods=['GET'])
 def get_notification_counts():
     """Get counts of pending friend requests and challenge invites for badge display."""
-    from models import Challenge, ChallengeStatusEnum
-    
     session = Session()
     try:
         user = get_current_user(session)
@@ -228,7 +279,15 @@ def get_notification_counts():
 # FRIENDS
 # ============================================================================
 
+def _friends_cache_key():
+    """Cache key for the friends list of the authenticated user."""
+    user_id = getattr(g, 'user_id', None)
+    return friends_cache_key(user_id) if user_id else None
+
+
 @social_bp.route('/api/friends', methods=['GET'])
+@etag_endpoint(key=_friends_cache_key, version=friends_version_key)
+@cache_endpoint(key=_friends_cache_key)
 def get_friends():
     """Get all friends and pending requests for the current user."""
     session = Session()
@@ -290,28 +349,33 @@ def send_friend_request():
     if not identifier:
         return jsonify({"error": "Email or username is required"}), 400
     
+    # Reject malformed identifiers before touching the database
+    if len(identifier) > FRIEND_IDENTIFIER_MAX_LENGTH:
+        return jsonify({"error": f"Identifier must be at most {FRIEND_IDENTIFIER_MAX_LENGTH} characters"}), 400
+    
+    is_email = '@' in identifier
+    if is_email:
+        local_part, _, domain = identifier.partition('@')
+        if not local_part or not domain:
+            return jsonify({"error": "Invalid email address"}), 400
+    
+    identifier_lower = identifier.lower()
+    
     session = Session()
     try:
         user = get_current_user(session)
         
-        is_email = '@' in identifier
-        
-        if is_email:
-            if user.email.lower() == identifier.lower():
-                return jsonify({"error": "Cannot send friend request to yourself"}), 400
-            
-            target_user = session.query(User).filter(
-                User.email.ilike(identifier)
-            ).first()
-        else:
-            if user.name.lower() == identifier.lower():
-                return jsonify({"error": "Cannot send friend request to yourself"}), 400
-            
-            target_user = session.query(User).filter(
-                User.name.ilike(identifier)
-            ).first()
+        # Self is excluded in the WHERE clause, so a match on our own row never comes back
+        lookup_column = User.email if is_email else User.name
+        target_user = session.query(User).filter(
+            func.lower(lookup_column) == identifier_lower,
+            User.id != user.id
+        ).first()
         
         if not target_user:
+            own_value = user.email if is_email else user.name
+            if own_value.lower() == identifier_lower:
+                return jsonify({"error": "Cannot send friend request to yourself"}), 400
             return jsonify({"error": f"User not found with {'email' if is_email else 'username'}: {identifier}"}), 404
         
         existing = session.query(Friendship).filter(
@@ -332,6 +396,7 @@ def send_friend_request():
         )
         session.add(friendship)
         session.commit()
+        invalidate_friends(user.id, target_user.id)
         
         return jsonify({
             "success": True,
@@ -370,6 +435,7 @@ def accept_friend_request():
         
         friendship.status = FriendshipStatusEnum.ACCEPTED
         session.commit()
+        invalidate_friends(friendship.user_id, friendship.friend_id)
         
         return jsonify({
             "success": True,
@@ -401,6 +467,7 @@ def remove_friend(friendship_id):
         
         session.delete(friendship)
         session.commit()
+        invalidate_friends(friendship.user_id, friendship.friend_id)
         
         return jsonify({"success": True, "message": "Friend removed"})
         
@@ -14,8 +14,10 @@ sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 from dotenv import load_dotenv
 load_dotenv()
 
+from sqlalchemy import select
+
 from models import Base, Badge, User, ActivityLog, CategoryEnum, SourceEnum, init_db
-from gamification import BADGE_DEFINITIONS, seed_items, ITEM_DEFINITIONS
+from gamification import BADGE_DEFINITIONS, seed_items, ITEM_DEFINITIONS, reset_badge_cache
 
 # Demo users for leaderboard
 DEMO_USERS = [
@@ -28,25 +30,28 @@ DEMO_USERS = [
 
 
 def seed_badges(session):
-    """Seed all badge definitions into the database"""
+    """Seed all badge definitions into the database (one executemany for the missing ones)"""
     print("Seeding badges...")
     
+    existing_names = set(session.scalars(select(Badge.name)))
+    rows = []
     for badge_def in BADGE_DEFINITIONS:
-        # Check if badge already exists
-        existing = session.query(Badge).filter_by(name=badge_def["name"]).first()
-        if existing:
+        if badge_def["name"] in existing_names:
             print(f"  Badge '{badge_def['name']}' already exists, skipping")
             continue
         
-        badge = Badge(
-            name=badge_def["name"],
-            description=badge_def["description"],
-            icon_name=badge_def["icon_name"]
-        )
-        session.add(badge)
+        rows.append({
+            "name": badge_def["name"],
+            "description": badge_def["description"],
+            "icon_name": badge_def["icon_name"]
+        })
         print(f"  Created badge: {badge_def['name']}")
     
+    if rows:
+        session.execute(Badge.__table__.insert(), rows)
+    
     session.commit()
+    reset_badge_cache()  # New rows: rebuild the name -> id plan on next use
     print(f"✓ Seeded {len(BADGE_DEFINITIONS)} badges")
 
 
@@ -62,6 +67,7 @@ def seed_demo_users(session):
     print("\nSeeding demo leaderboard users...")
     
     categories = list(CategoryEnum)
+    activity_rows = []  # Inserted with one executemany once every user has an id
     
     for user_data in DEMO_USERS:
         # Check if user already exists
@@ -108,20 +114,22 @@ def seed_demo_users(session):
             base = base_scores.get(category, 0)
             score = base * (duration / 60)
             
-            activity = ActivityLog(
-                user_id=user.id,
-                raw_input=f"Demo activity {i+1}",
-                activity_name=f"{category.value} activity",
-                category=category,
-                duration_minutes=duration,
-                productivity_score=score,
-                source=SourceEnum.MANUAL,
-                timestamp=timestamp
-            )
-            session.add(activity)
+            activity_rows.append({
+                "user_id": user.id,
+                "raw_input": f"Demo activity {i+1}",
+                "activity_name": f"{category.value} activity",
+                "category": category,
+                "duration_minutes": duration,
+                "productivity_score": score,
+                "source": SourceEnum.MANUAL,
+                "timestamp": timestamp
+            })
         
         print(f"  Created user: {user_data['name']} (Level {level}, {num_activities} activities)")
     
+    if activity_rows:
+        session.execute(ActivityLog.__table__.insert(), activity_rows)
+    
     session.commit()
     print(f"✓ Seeded {len(DEMO_USERS)} demo users")
 
@@ -7,6 +7,8 @@ from typing import Dict, List, Any
 from datetime import datetime, timedelta
 from sqlalchemy.orm import Session as SQLSession
 
+from models import ActivityLog
+
 # ============================================================================
 # SKILL TREE DEFINITIONS
 # ============================================================================
@@ -249,8 +251,6 @@ def get_skill_tree_progress(session: SQLSession, user_id: int) -> Dict[str, Any]
     Returns:
         Dict with progress for each skill tree
     """
-    from models import ActivityLog, CategoryEnum
-    
     # Get all user activities
     activities = session.query(ActivityLog).filter(
         ActivityLog.user_id == user_id
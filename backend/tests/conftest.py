@@ -1,64 +1,106 @@
-import pytest
 import os
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from models import Base
+
+# Point the app at an in-memory SQLite database before app.py builds its engine
+os.environ['DATABASE_URL'] = "sqlite:///:memory:"
+os.environ.setdefault('JWT_SECRET', "test-secret-do-not-use-in-production")
+os.environ.pop('REDIS_URL', None)  # Exercise the in-process cache fallback
+
+import itertools
+
+import pytest
+
+import app as app_module
+import cache
 from app import app as flask_app
+from auth import generate_token
+from models import Base, User
+from gamification import seed_items
+from seed_data import seed_badges
+from utils import get_or_create_demo_user
 
-# Re-init blueprint helpers
-from auth import init_auth_routes
-from routes.activities import init_activities_routes
-from routes.goals import init_goals_routes
-# ... import other init functions as needed, start with core ones
 
-# Use an in-memory SQLite database for testing
-TEST_DATABASE_URL = "sqlite:///:memory:"
+# Unique emails across the whole (session-scoped) database
+_user_numbers = itertools.count(1)
+
 
 @pytest.fixture(scope="session")
 def test_engine():
-    """Create a test engine that connects to in-memory SQLite."""
-    engine = create_engine(TEST_DATABASE_URL, connect_args={"check_same_thread": False})
-    return engine
+    """The app's own engine (in-memory SQLite, one connection per thread)."""
+    return app_module.engine
+
 
 @pytest.fixture(scope="session")
-def test_session_factory(test_engine):
-    """Create a session factory for the test engine."""
-    return sessionmaker(bind=test_engine)
+def test_session_factory():
+    """The app's scoped Session registry, so tests and handlers share one database."""
+    return app_module.Session
+
 
 @pytest.fixture(scope="session")
 def app(test_engine, test_session_factory):
-    """Create and configure a new app instance for each test session."""
+    """The Flask app, with the item catalogue and badges seeded once."""
     flask_app.config['TESTING'] = True
-    flask_app.config['SQLALCHEMY_DATABASE_URI'] = TEST_DATABASE_URL
-    
-    # Create tables in the test database
-    Base.metadata.create_all(test_engine)
-    
-    # CRITICAL: Re-initialize blueprints with the TEST Session factory
-    # This replaces the real Postgres Session with our SQLite Test Session
-    init_auth_routes(test_session_factory)
-    init_activities_routes(test_session_factory)
-    init_goals_routes(test_session_factory)
-    # Add others if we test them
-    
+
+    session = test_session_factory()
+    seed_items(session)
+    seed_badges(session)
+    test_session_factory.remove()
+
     yield flask_app
-    
+
     # Teardown
     Base.metadata.drop_all(test_engine)
 
+
+@pytest.fixture(autouse=True)
+def _clear_response_cache():
+    """Cached responses and version counters must not leak between tests."""
+    cache._memory_cache.clear()
+    cache._memory_versions.clear()
+    yield
+
+
 @pytest.fixture(scope="function")
 def client(app):
     """A test client for the app."""
     return app.test_client()
 
+
+@pytest.fixture(scope="function")
+def test_client(client):
+    return client
+
+
 @pytest.fixture(scope="function")
-def session(test_session_factory):
-    """
-    Creates a new database session for a test.
-    Rolls back transaction after test.
-    """
+def session(app, test_session_factory):
+    """A database session for a test; released after the test."""
     session = test_session_factory()
     try:
         yield session
     finally:
-        session.close()
+        test_session_factory.remove()
+
+
+@pytest.fixture(scope="function")
+def test_db_session(session):
+    return session
+
+
+@pytest.fixture(scope="function")
+def demo_user(session):
+    """The demo user unauthenticated requests act as."""
+    return get_or_create_demo_user(session)
+
+
+@pytest.fixture(scope="function")
+def make_user(session):
+    """Factory: create a user and return (user, Authorization headers)."""
+    def _make_user(**fields):
+        n = next(_user_numbers)
+        fields.setdefault('email', f"user{n}@example.com")
+        fields.setdefault('name', f"User {n}")
+        user = User(**fields)
+        session.add(user)
+        session.commit()
+        return user, {"Authorization": f"Bearer {generate_token(user.id)}"}
+
+    return _make_user
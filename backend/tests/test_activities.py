@@ -6,6 +6,8 @@ CRUD and scoring logic (dashboard, log_activity).
 import pytest
 from datetime import datetime, timedelta
 
+import cache
+from cache import dashboard_cache_prefix
 from models import User, ActivityLog, CategoryEnum, SourceEnum
 
 
@@ -96,3 +98,79 @@ def test_scoring_leisure_negative(test_client, demo_user):
     data = r.get_json()
     assert data["activity"]["productivity_score"] < 0
     assert data["activity"]["category"] == CategoryEnum.LEISURE.value
+
+
+# ----------------------------------------------------------------------------
+# Dashboard response cache
+# ----------------------------------------------------------------------------
+
+def _dashboard(client, headers, tz_offset=0):
+    r = client.get(f"/api/dashboard?tz_offset={tz_offset}", headers=headers)
+    assert r.status_code == 200
+    return r.get_json()
+
+
+def test_dashboard_cache_invalidated_by_writes(client, make_user):
+    """Log / update / delete each show up on the very next (cached) dashboard read."""
+    _, headers = make_user()
+    assert _dashboard(client, headers)["activity_count"] == 0
+    assert _dashboard(client, headers)["activity_count"] == 0  # Served from cache
+    
+    r = client.post("/api/log_activity", json={"text": "Coded for 2 hours"}, headers=headers)
+    assert r.status_code == 201
+    activity_id = r.get_json()["activity"]["id"]
+    after_log = _dashboard(client, headers)
+    assert after_log["activity_count"] == 1
+    
+    r = client.put(f"/api/activities/{activity_id}", json={"duration_minutes": 30}, headers=headers)
+    assert r.status_code == 200
+    after_update = _dashboard(client, headers)
+    assert after_update["daily_score"] != after_log["daily_score"]
+    
+    r = client.delete(f"/api/activities/{activity_id}", headers=headers)
+    assert r.status_code == 200
+    assert _dashboard(client, headers)["activity_count"] == 0
+
+
+def test_dashboard_cache_is_per_user(client, make_user):
+    """User B never receives user A's cached dashboard."""
+    _, headers_a = make_user()
+    _, headers_b = make_user()
+    client.post("/api/log_activity", json={"text": "Coded for 2 hours"}, headers=headers_a)
+    
+    assert _dashboard(client, headers_a)["activity_count"] == 1
+    assert _dashboard(client, headers_b)["activity_count"] == 0
+    assert _dashboard(client, headers_a)["activity_count"] == 1
+
+
+def test_dashboard_cache_is_per_tz_offset(client, make_user):
+    """Each tz offset is cached under its own key."""
+    user, headers = make_user()
+    _dashboard(client, headers, tz_offset=0)
+    _dashboard(client, headers, tz_offset=300)
+    
+    keys = [k for k in cache._memory_cache if k.startswith(dashboard_cache_prefix(user.id))]
+    assert len(keys) == 2
+    assert any(k.endswith(":0") for k in keys) and any(k.endswith(":300") for k in keys)
+
+
+# ----------------------------------------------------------------------------
+# Heatmap ETag
+# ----------------------------------------------------------------------------
+
+def test_heatmap_etag_304_and_rolls_on_log(client, make_user, monkeypatch):
+    """A matching If-None-Match gets 304; logging an activity changes the tag."""
+    monkeypatch.setattr(cache.time, "time", lambda: 1_000_000.0)  # Pin the ETag time window
+    _, headers = make_user()
+    
+    r = client.get("/api/activities/heatmap", headers=headers)
+    assert r.status_code == 200
+    etag = r.headers["ETag"]
+    
+    r = client.get("/api/activities/heatmap", headers={**headers, "If-None-Match": etag})
+    assert r.status_code == 304
+    
+    client.post("/api/log_activity", json={"text": "Coded for 2 hours"}, headers=headers)
+    r = client.get("/api/activities/heatmap", headers={**headers, "If-None-Match": etag})
+    assert r.status_code == 200
+    assert r.headers["ETag"] != etag
@@ -1,6 +1,15 @@
 import json
+import time
+from datetime import datetime
+import bcrypt
+import jwt
 import pytest
 
+import auth
+import cache
+from auth import get_user_id_from_token, TOKEN_CACHE_MAX_SECONDS
+from models import User
+
 def test_register_user(client):
     """Test user registration"""
     response = client.post('/api/auth/register', json={
@@ -46,3 +55,64 @@ def test_login_invalid_credentials(client):
         "password": "wrongpassword"
     })
     assert response.status_code == 401
+
+def test_login_upgrades_bcrypt_hash_to_argon2id(client, session, make_user):
+    """A legacy bcrypt user can log in, and the hash is rewritten as argon2id"""
+    legacy_hash = bcrypt.hashpw(b"password123", bcrypt.gensalt(rounds=4)).decode('utf-8')
+    user, _ = make_user(email="legacy@example.com", password_hash=legacy_hash)
+    
+    response = client.post('/api/auth/login', json={
+        "email": "legacy@example.com",
+        "password": "password123"
+    })
+    assert response.status_code == 200
+    
+    session.expire_all()
+    upgraded_hash = session.get(User, user.id).password_hash
+    assert upgraded_hash.startswith('$argon2id$')
+    
+    # The upgraded hash verifies on the next login
+    response = client.post('/api/auth/login', json={
+        "email": "legacy@example.com",
+        "password": "password123"
+    })
+    assert response.status_code == 200
+    assert "token" in response.get_json()
+
+def test_token_cache_hit_and_expiry(test_session_factory, session, make_user, monkeypatch):
+    """A resolved token is served from the cache, for at most TOKEN_CACHE_MAX_SECONDS"""
+    user, headers = make_user()
+    
+    assert get_user_id_from_token(headers["Authorization"], test_session_factory) == user.id
+    (key, (expires_at, body)), = [(k, v) for k, v in cache._memory_cache.items() if k.startswith("tok:")]
+    assert body == str(user.id).encode('utf-8')
+    assert expires_at - time.monotonic() <= TOKEN_CACHE_MAX_SECONDS
+    
+    # Cached: neither the JWT nor the users table is consulted again
+    monkeypatch.setattr(auth, "decode_token", lambda token: pytest.fail("token was decoded"))
+    assert get_user_id_from_token(headers["Authorization"], test_session_factory) == user.id
+    monkeypatch.undo()
+    
+    # Once the entry lapses, a deleted user's token no longer resolves
+    session.delete(user)
+    session.commit()
+    cache._memory_cache[key] = (time.monotonic() - 1, body)
+    assert get_user_id_from_token(headers["Authorization"], test_session_factory) is None
+
+def test_token_resolves_uncached_when_cache_is_down(test_session_factory, make_user, monkeypatch):
+    """A cache outage falls back to jwt.decode and the users lookup"""
+    user, headers = make_user()
+    
+    def cache_down(*args):
+        raise ConnectionError("cache unreachable")
+    monkeypatch.setattr(auth, "cache_get", cache_down)
+    monkeypatch.setattr(auth, "cache_set", cache_down)
+    
+    assert get_user_id_from_token(headers["Authorization"], test_session_factory) == user.id
+
+def test_token_missing_claims_is_anonymous(client):
+    """A validly signed token without user_id doesn't break public endpoints"""
+    token = jwt.encode({'iat': datetime.utcnow()}, auth.JWT_SECRET_BYTES, algorithm=auth.JWT_ALGORITHM)
+    
+    response = client.get('/api/leaderboard', headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200
@@ -0,0 +1,164 @@
+"""
+FocusFlow - Gamification tests.
+Loot chests (open_chest / open_chests) and badge thresholds.
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+import gamification
+from gamification import open_chest, open_chests, get_item_dicts, check_and_award_badges
+from models import User, UserItem, ActivityLog, CategoryEnum
+
+
+@pytest.fixture
+def first_item_every_draw(monkeypatch, session):
+    """Make every chest draw land on the first catalogue item."""
+    monkeypatch.setattr(gamification.random, "random", lambda: 0.0)
+    return next(iter(get_item_dicts(session).values()))
+
+
+def _owned(session, user):
+    return {row.item_id: row.count for row in session.query(UserItem).filter_by(user_id=user.id)}
+
+
+def _credits(session, user):
+    session.expire_all()
+    return session.get(User, user.id).chest_credits
+
+
+# ----------------------------------------------------------------------------
+# Loot chests
+# ----------------------------------------------------------------------------
+
+def test_open_chests_more_than_credits_changes_nothing(session, make_user):
+    user, _ = make_user(chest_credits=2)
+
+    result = open_chests(session, user, 3)
+
+    assert result == {"error": "No keys available", "credits_required": True}
+    assert _credits(session, user) == 2
+    assert _owned(session, user) == {}
+
+
+@pytest.mark.parametrize("n", [0, -1])
+def test_open_chests_rejects_non_positive_count(session, make_user, n):
+    user, _ = make_user(chest_credits=2)
+
+    result = open_chests(session, user, n)
+
+    assert "error" in result
+    assert _credits(session, user) == 2
+    assert _owned(session, user) == {}
+
+
+def test_open_chests_same_item_twice_counts_up(session, make_user, first_item_every_draw):
+    user, _ = make_user(chest_credits=3)
+
+    result = open_chests(session, user, 2)
+
+    drops = result["drops"]
+    assert [d["item"]["id"] for d in drops] == [first_item_every_draw["id"]] * 2
+    assert [d["count"] for d in drops] == [1, 2]
+    assert [d["is_new"] for d in drops] == [True, False]
+    assert drops[0]["rarity"] == first_item_every_draw["rarity"]
+    assert _credits(session, user) == 1
+    assert _owned(session, user) == {first_item_every_draw["id"]: 2}
+
+
+def test_open_chests_continues_from_stored_count(session, make_user, first_item_every_draw):
+    user, _ = make_user(chest_credits=2)
+    session.add(UserItem(user_id=user.id, item_id=first_item_every_draw["id"], count=5))
+    session.commit()
+
+    drops = open_chests(session, user, 2)["drops"]
+
+    assert [d["count"] for d in drops] == [6, 7]
+    assert not any(d["is_new"] for d in drops)
+    assert _owned(session, user) == {first_item_every_draw["id"]: 7}
+
+
+def test_open_chest_returns_single_drop(session, make_user, first_item_every_draw):
+    user, _ = make_user(chest_credits=1)
+
+    result = open_chest(session, user)
+
+    assert result == {
+        "item": first_item_every_draw,
+        "is_new": True,
+        "count": 1,
+        "rarity": first_item_every_draw["rarity"]
+    }
+    assert _credits(session, user) == 0
+
+
+def test_open_chests_endpoint(client, session, make_user):
+    user, headers = make_user(chest_credits=3)
+
+    r = client.post("/api/user/open_chests", json={"count": 2}, headers=headers)
+
+    assert r.status_code == 200
+    data = r.get_json()
+    assert len(data["drops"]) == 2
+    assert data["credits_remaining"] == 1
+
+    r = client.post("/api/user/open_chests", json={"count": 0}, headers=headers)
+    assert r.status_code == 400
+
+    r = client.post("/api/user/open_chests", json={"count": 5}, headers=headers)
+    assert r.status_code == 400
+    assert r.get_json()["credits_required"] is True
+    assert _credits(session, user) == 1
+
+
+# ----------------------------------------------------------------------------
+# Badges
+# ----------------------------------------------------------------------------
+
+def _log(session, user, timestamp, minutes, category=CategoryEnum.LEISURE):
+    """Add an activity and return the names of the badges it awards."""
+    activity = ActivityLog(
+        user_id=user.id, raw_input="test", activity_name="test", category=category,
+        duration_minutes=minutes, productivity_score=0.0, timestamp=timestamp
+    )
+    session.add(activity)
+    session.flush()
+    awarded = check_and_award_badges(session, user, activity, local_hour=12)
+    session.commit()
+    return {badge["name"] for badge in awarded}
+
+
+def test_iron_streak_needs_seven_active_days(session, make_user):
+    user, _ = make_user()
+    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+
+    # Six consecutive days ending today: one short
+    for days_ago in range(5, -1, -1):
+        assert "Iron Streak" not in _log(session, user, today - timedelta(days=days_ago), 10)
+
+    assert "Iron Streak" in _log(session, user, today - timedelta(days=6), 10)
+    assert "Iron Streak" not in _log(session, user, today, 10)
+
+
+def test_weekend_warrior_needs_five_hours_on_one_weekend_day(session, make_user):
+    user, _ = make_user()
+    saturday = datetime(2024, 6, 1, 12)
+    friday = saturday - timedelta(days=1)
+
+    # Minutes on another day don't count toward the weekend day
+    assert "Weekend Warrior" not in _log(session, user, friday, 300)
+    assert "Weekend Warrior" not in _log(session, user, saturday, 299)
+    assert "Weekend Warrior" in _log(session, user, saturday, 1)
+    assert "Weekend Warrior" not in _log(session, user, saturday, 60)
+
+
+def test_social_butterfly_needs_twenty_hours_of_social(session, make_user):
+    user, _ = make_user()
+    now = datetime(2024, 6, 3, 12)
+
+    # Other categories don't count toward Social
+    assert "Social Butterfly" not in _log(session, user, now, 1200, CategoryEnum.CAREER)
+    assert "Social Butterfly" not in _log(session, user, now, 1199, CategoryEnum.SOCIAL)
+    assert "Social Butterfly" in _log(session, user, now, 1, CategoryEnum.SOCIAL)
+    assert "Social Butterfly" not in _log(session, user, now, 60, CategoryEnum.SOCIAL)
@@ -0,0 +1,66 @@
+"""
+FocusFlow - Intervention API tests.
+Gaming heartbeat counted in Redis.
+"""
+
+import pytest
+from sqlalchemy import update
+
+from models import User
+from routes import intervention
+
+
+class FakeRedis:
+    """The counter subset of redis-py the heartbeat uses."""
+
+    def __init__(self):
+        self.values = {}
+        self.ttls = {}
+
+    def pipeline(self):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.commands = []
+
+    def incr(self, key):
+        self.commands.append(lambda: self.redis.values.__setitem__(key, self.redis.values.get(key, 0) + 1)
+                             or self.redis.values[key])
+
+    def expire(self, key, seconds):
+        self.commands.append(lambda: self.redis.ttls.__setitem__(key, seconds) or True)
+
+    def execute(self):
+        return [command() for command in self.commands]
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    redis = FakeRedis()
+    monkeypatch.setattr(intervention, "redis_client", redis)
+    return redis
+
+
+def test_heartbeat_writes_through_at_default_allowance(client, session, make_user, fake_redis, monkeypatch):
+    """With no allowance set, reaching the default allowance still persists the count."""
+    monkeypatch.setattr(intervention, "DEFAULT_GAMING_ALLOWANCE", 58)
+    user, headers = make_user()
+    # Legacy row: the column default never applied
+    session.execute(update(User).where(User.id == user.id).values(daily_gaming_allowance=None))
+    session.commit()
+
+    r = client.post("/api/intervention/heartbeat", json={"app_detected": "Game"}, headers=headers)
+    assert r.status_code == 200
+    (key,) = fake_redis.values
+    assert fake_redis.ttls[key] == intervention.GAMING_COUNTER_TTL_SECONDS
+
+    fake_redis.values[key] = 57
+    r = client.post("/api/intervention/heartbeat", json={"app_detected": "Game"}, headers=headers)
+
+    assert r.get_json()["gaming_minutes"] == 58
+    assert r.get_json()["status"] == "CRITICAL"
+    session.expire_all()
+    assert session.get(User, user.id).today_gaming_minutes == 58
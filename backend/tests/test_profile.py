@@ -0,0 +1,62 @@
+"""
+FocusFlow - Profile API tests.
+Data export (streamed CSV and JSON).
+"""
+
+import csv
+import io
+from datetime import datetime, timedelta
+
+import pytest
+
+from models import ActivityLog, CategoryEnum
+from utils import STREAM_BATCH_SIZE
+
+
+# ----------------------------------------------------------------------------
+# Export
+# ----------------------------------------------------------------------------
+
+@pytest.fixture
+def exporting_user(session, make_user):
+    """A user with more activities than one stream batch holds."""
+    user, headers = make_user()
+    start = datetime(2024, 1, 1)
+    session.execute(ActivityLog.__table__.insert(), [
+        {
+            "user_id": user.id, "raw_input": f"activity {i}", "activity_name": f"Activity {i}",
+            "category": CategoryEnum.CAREER.name, "duration_minutes": 30, "productivity_score": 5.0,
+            "is_focus_session": False, "source": "MANUAL", "timestamp": start + timedelta(minutes=i)
+        }
+        for i in range(STREAM_BATCH_SIZE + 1)
+    ])
+    session.commit()
+    return user, headers
+
+
+def test_export_csv_streams_every_row(client, exporting_user):
+    _, headers = exporting_user
+
+    r = client.get("/api/user/export_data", headers=headers)
+
+    assert r.status_code == 200
+    assert r.mimetype == "text/csv"
+    rows = list(csv.reader(io.StringIO(r.get_data(as_text=True))))
+    body = rows[1:]
+    assert len(body) == STREAM_BATCH_SIZE + 1
+    # Newest first
+    assert body[0][1] == f"Activity {STREAM_BATCH_SIZE}"
+    assert body[-1][1] == "Activity 0"
+
+
+def test_export_json_streams_every_row(client, exporting_user):
+    _, headers = exporting_user
+
+    r = client.get("/api/user/export_data?format=json", headers=headers)
+
+    assert r.status_code == 200
+    assert r.mimetype == "application/json"
+    activities = r.get_json()
+    assert len(activities) == STREAM_BATCH_SIZE + 1
+    assert activities[0]["activity_name"] == f"Activity {STREAM_BATCH_SIZE}"
+    assert activities[-1]["activity_name"] == "Activity 0"
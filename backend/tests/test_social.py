@@ -0,0 +1,129 @@
+"""
+FocusFlow - Social API tests.
+Friendships (SMALLINT status storage and its JSON form) and leaderboards.
+"""
+
+import pytest
+from redis.exceptions import DataError
+from sqlalchemy import text
+
+from models import Friendship, FriendshipStatusEnum
+from routes import social
+
+
+# ----------------------------------------------------------------------------
+# Friendships
+# ----------------------------------------------------------------------------
+
+def test_friendship_status_round_trip(session, make_user):
+    """Status is stored as 0/1 and loads back as FriendshipStatusEnum."""
+    requester, _ = make_user()
+    receiver, _ = make_user()
+    friendship = Friendship(user_id=requester.id, friend_id=receiver.id, status=FriendshipStatusEnum.PENDING)
+    session.add(friendship)
+    session.commit()
+
+    raw = session.execute(text("SELECT status FROM friendships WHERE id = :id"), {"id": friendship.id}).scalar()
+    assert raw == 0
+
+    friendship.status = FriendshipStatusEnum.ACCEPTED
+    session.commit()
+    session.expire_all()
+
+    loaded = session.get(Friendship, friendship.id)
+    assert loaded.status is FriendshipStatusEnum.ACCEPTED
+    assert session.execute(text("SELECT status FROM friendships WHERE id = :id"), {"id": friendship.id}).scalar() == 1
+    assert loaded.to_dict()["status"] == "accepted"
+
+
+def test_friends_endpoints_report_status_strings(client, make_user):
+    """The API serializes status as the "pending" / "accepted" strings the frontend reads."""
+    requester, requester_headers = make_user()
+    receiver, receiver_headers = make_user()
+
+    r = client.post("/api/friends/request", json={"identifier": receiver.email}, headers=requester_headers)
+    assert r.status_code == 201
+    friendship = r.get_json()["friendship"]
+    assert friendship["status"] == "pending"
+
+    sent = client.get("/api/friends", headers=requester_headers).get_json()["pending_sent"]
+    assert [f["status"] for f in sent] == ["pending"]
+    received = client.get("/api/friends", headers=receiver_headers).get_json()["pending_received"]
+    assert [f["status"] for f in received] == ["pending"]
+
+    r = client.post("/api/friends/accept", json={"friendship_id": friendship["id"]}, headers=receiver_headers)
+    assert r.status_code == 200
+    assert r.get_json()["friendship"]["status"] == "accepted"
+
+    friends = client.get("/api/friends", headers=requester_headers).get_json()["friends"]
+    assert [f["user"]["id"] for f in friends] == [receiver.id]
+
+
+# ----------------------------------------------------------------------------
+# Leaderboard
+# ----------------------------------------------------------------------------
+
+class FakeRedis:
+    """The sorted-set / hash subset of redis-py the leaderboard cache uses."""
+
+    def __init__(self):
+        self.zsets = {}
+        self.hashes = {}
+
+    def pipeline(self):
+        return FakePipeline(self)
+
+    def zrevrange(self, key, start, end, withscores=False):
+        members = self.zsets.get(key, {})
+        # Like Redis: score descending, ties by member bytes descending
+        ranked = sorted(members.items(), key=lambda entry: (entry[1], entry[0]), reverse=True)
+        return ranked[start:end + 1]
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.results = []
+
+    def delete(self, key):
+        self.redis.zsets.pop(key, None)
+
+    def zadd(self, key, mapping):
+        zset = self.redis.zsets.setdefault(key, {})
+        for member, score in mapping.items():
+            zset[str(member).encode()] = float(score)
+
+    def hset(self, key, mapping):
+        for field, value in mapping.items():
+            if value is None:
+                raise DataError(f"Invalid input of type: 'NoneType' for field {field}")
+        self.redis.hashes.setdefault(key, {}).update({field: str(value).encode() for field, value in mapping.items()})
+
+    def hmget(self, key, *fields):
+        stored = self.redis.hashes.get(key, {})
+        self.results.append([stored.get(field) for field in fields])
+
+    def expire(self, key, seconds):
+        pass
+
+    def execute(self):
+        results, self.results = self.results, []
+        return results
+
+
+def test_redis_leaderboard_cache_round_trips_sql_order(monkeypatch):
+    """Ties come back in User.id order, and None fields survive the hash."""
+    monkeypatch.setattr(social, "redis_client", FakeRedis())
+    cache_key = ("2024-06-03", 0)
+    result = {
+        "week_start": "2024-06-03",
+        "leaderboard": [
+            {"user_id": 7, "name": "Top", "level": 3, "avatar_color": "#ff0000", "weekly_score": 9.5, "rank": 1},
+            {"user_id": 12, "name": "Tie A", "level": None, "avatar_color": "#6366f1", "weekly_score": 4.0, "rank": 2},
+            {"user_id": 13, "name": "Tie B", "level": 1, "avatar_color": "#6366f1", "weekly_score": 4.0, "rank": 3},
+        ]
+    }
+
+    social._set_leaderboard_cache(cache_key, result)
+
+    assert social._get_cached_leaderboard(cache_key) == result
@@ -3,10 +3,15 @@ FocusFlow - Shared Utilities
 Common helper functions used across all route blueprints.
 """
 
-from datetime import datetime, timedelta
-from flask import g
+import csv
+import io
+from datetime import datetime, timedelta, date
+from flask import g, current_app, has_request_context
 from models import User, Goal, ActivityLog
 
+# Rows fetched per round-trip when streaming large result sets
+STREAM_BATCH_SIZE = 500
+
 
 def get_current_user(session, Session=None):
     """
@@ -21,7 +26,7 @@ def get_current_user(session, Session=None):
     """
     user_id = getattr(g, 'user_id', None)
     if user_id:
-        return session.query(User).filter_by(id=user_id).first()
+        return session.get(User, user_id)
     return get_or_create_demo_user(session)
 
 
@@ -48,6 +53,100 @@ def get_or_create_demo_user(session):
     return user
 
 
+def request_now():
+    """
+    Current UTC time, read once per request and shared via g, so every timestamp
+    written while handling one request (activity, badges, items) agrees.
+    Outside a request (scripts, tests) it is simply datetime.utcnow().
+    """
+    if not has_request_context():
+        return datetime.utcnow()
+    if '_now_utc' not in g:
+        g._now_utc = datetime.utcnow()
+    return g._now_utc
+
+
+def get_week_start(tz_offset=0):
+    """
+    Start of the current week (Monday) in the user's local time.
+    
+    Args:
+        tz_offset: Minutes behind UTC, as sent by the frontend (e.g. 300 for EST)
+    
+    Returns:
+        (start_of_week local date, start of that day as a naive UTC datetime)
+    """
+    local_now = request_now() - timedelta(minutes=tz_offset)
+    ordinal = local_now.toordinal()
+    start_of_week = date.fromordinal(ordinal - (ordinal - 1) % 7)  # Ordinal 1 is a Monday
+    start_datetime_utc = datetime(start_of_week.year, start_of_week.month, start_of_week.day) + timedelta(minutes=tz_offset)
+    return start_of_week, start_datetime_utc
+
+
+def stream_json_array(session_factory, stmt, serializer):
+    """
+    Stream the rows of a select() as a JSON array, one element at a time.
+    Rows are pulled from the DB in batches so memory stays O(batch), not O(total).
+    
+    Args:
+        session_factory: Plain sessionmaker (not a scoped_session registry, whose
+            thread-local session the request teardown would close mid-stream);
+            the generator owns (and closes) its own session
+        stmt: SQLAlchemy select() returning ORM entities
+        serializer: Callable turning one row into a JSON-serializable dict
+    
+    Yields:
+        str chunks that together form a JSON array
+    """
+    session = session_factory()
+    try:
+        yield '['
+        rows = session.scalars(stmt.execution_options(yield_per=STREAM_BATCH_SIZE))
+        for i, row in enumerate(rows):
+            chunk = current_app.json.dumps(serializer(row))
+            yield chunk if i == 0 else ',' + chunk
+        yield ']'
+    finally:
+        session.close()
+
+
+def stream_csv(session_factory, stmt, header, row_builder):
+    """
+    Stream the rows of a select() as CSV, one line at a time.
+    Same batching and session ownership as stream_json_array, but rows are plain
+    Core Row tuples (select the columns you need) - no ORM objects are built.
+    
+    Args:
+        session_factory: Plain sessionmaker, as for stream_json_array
+        stmt: SQLAlchemy select() of columns
+        header: List of column titles for the first line
+        row_builder: Callable turning one Row into a list of CSV values
+    
+    Yields:
+        str chunks, one CSV line each
+    """
+    session = session_factory()
+    try:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        
+        def flush():
+            chunk = buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            return chunk
+        
+        writer.writerow(header)
+        yield flush()
+        
+        rows = session.execute(stmt.execution_options(stream_results=True, yield_per=STREAM_BATCH_SIZE))
+        for row in rows:
+            writer.writerow(row_builder(row))
+            yield flush()
+    finally:
+        session.close()
+
+
 def build_insight_context(session, user_id):
     """
     Build context for AI insights: active goals and recent Focus Session stats.
@@ -77,7 +176,7 @@ def build_insight_context(session, user_id):
     focus_activities = session.query(ActivityLog).filter(
         ActivityLog.user_id == user_id,
         ActivityLog.timestamp >= seven_days_ago,
-        ActivityLog.is_focus_session == 1
+        ActivityLog.is_focus_session == True
     ).all()
     focus_sessions_last_7_days = len(focus_activities)
     focus_minutes_last_7_days = sum(a.duration_minutes or 30 for a in focus_activities)